@@ -0,0 +1,10 @@
+"""
+Benchmarks, run as modules: python -m benchmarks.<name>
+Settings are read on import of src, so the package prepares the environment first:
+benchmarks don't need the database of the application or nalog credentials unless they set their own
+"""
+import os
+
+os.environ.setdefault('MODE', 'BENCHMARK')
+os.environ.setdefault('DB_NAME', '')
+os.environ.setdefault('CLIENT_SECRET', '')
@@ -0,0 +1,112 @@
+"""
+Load test of receipts fetching against the local stand-in of 'rkkt_nalog' service.
+Reports receipts/sec and p50/p99 latency of get_ticket and get_tickets.
+Run: python -m benchmarks.nalog_load --receipts 500 --workers 10 --latency 0.05
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from tests.fake_nalog import FakeNalogConfig, FakeNalogServer
+
+
+def make_qrs(count: int, start: int = 0) -> list[str]:
+    return [f"t=20240211T1400&s=411.70&fn=7284440700373884&i={i}&fp=1152442848&n=1"
+            for i in range(start, start + count)]
+
+
+def report(name: str, latencies: list[float], errors: int, elapsed: float) -> None:
+    count = len(latencies) + errors
+    p50, p99 = 0.0, 0.0
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100)
+        p50, p99 = percentiles[49], percentiles[98]
+    print(f"{name:<12} receipts: {count:>6}  errors: {errors:>4}  "
+          f"receipts/sec: {count / elapsed:>8.1f}  "
+          f"p50: {p50 * 1000:>7.1f} ms  p99: {p99 * 1000:>7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--receipts', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--session-lifetime', type=float, default=3600.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--metrics', choices=['json', 'prometheus'],
+                        help="print timings of nalog API requests")
+    args = parser.parse_args()
+
+    config = FakeNalogConfig(latency=args.latency,
+                             error_rate=args.error_rate,
+                             session_lifetime=args.session_lifetime)
+    db_dir = tempfile.TemporaryDirectory()
+    with FakeNalogServer(config) as server:
+        # settings are read on import of src, so the environment is prepared first
+        os.environ.update({
+            'MODE': 'BENCHMARK',
+            'DB_NAME': str(Path(db_dir.name) / 'benchmark.sqlite3'),
+            'CLIENT_SECRET': config.client_secret,
+            'NALOG_API_URL': server.url,
+            'NALOG_POOL_SIZE': str(args.workers),
+            'NALOG_RATE_LIMIT': str(args.rate_limit),
+            'NALOG_METRICS': str(args.metrics is not None),
+        })
+        from src.receipts import utils
+        from src.receipts.nalog_api import authorization
+        from src.settings import settings, NalogSession
+        from src.storage.base import Base, engine
+
+        Base.metadata.create_all(engine)
+        tokens = authorization('inn', config.inn, config.password, client_secret=config.client_secret)
+        if tokens is None:
+            raise SystemExit("Authorization in the fake service failed")
+        settings.auth_nalog = NalogSession.model_validate(tokens)
+        utils.session_refresher.start()
+
+        latencies: list[float] = []
+        errors = 0
+        start = time.perf_counter()
+        for qr in make_qrs(args.receipts):
+            request_start = time.perf_counter()
+            if utils.get_ticket(qr) is None:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - request_start)
+        report('get_ticket', latencies, errors, time.perf_counter() - start)
+
+        # latency of every receipt in the bulk is measured inside the worker threads
+        get_ticket = utils.get_ticket
+        bulk_latencies: dict[str, float] = {}
+
+        def timed_get_ticket(qr: str) -> str | None:
+            request_start = time.perf_counter()
+            ticket_json = get_ticket(qr)
+            bulk_latencies[qr] = time.perf_counter() - request_start
+            return ticket_json
+
+        utils.get_ticket = timed_get_ticket  # type: ignore[assignment]
+        errors = 0
+        start = time.perf_counter()
+        for qr, result in utils.get_tickets(make_qrs(args.receipts, start=args.receipts),
+                                            max_workers=args.workers):
+            if isinstance(result, Exception):
+                errors += 1
+                bulk_latencies.pop(qr, None)
+        report('get_tickets', list(bulk_latencies.values()), errors, time.perf_counter() - start)
+        utils.get_ticket = get_ticket  # type: ignore[assignment]
+
+        utils.session_refresher.stop()
+        print(f"server requests: {server.state.requests}")
+        if args.metrics is not None:
+            from src.receipts.metrics import registry
+            print(registry.to_json() if args.metrics == 'json' else registry.to_prometheus())
+    db_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
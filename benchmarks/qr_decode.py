@@ -0,0 +1,67 @@
+"""
+Benchmark of QR decoding of receipt photos: the whole image against the reduced mode
+(QR region found in the reduced image, only the region decoded).
+Peak memory is measured by tracemalloc, it includes images (numpy arrays) but not inner buffers of libjpeg and zbar.
+Run: python -m benchmarks.qr_decode data/receipts/ --repeat 3
+"""
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+from src.receipts.qr_code import DecodeResult, QRCReader
+from src.receipts.utils import IMAGE_SUFFIXES
+
+TEST_IMAGES = Path(__file__).parent.parent / "tests/data"
+
+
+def iter_images(paths: list[str]) -> list[Path]:
+    images = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            images += sorted(p for p in path.rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)
+        else:
+            images.append(path)
+    return images
+
+
+def measure(image: Path, reduced: bool, repeat: int) -> tuple[float, float, DecodeResult]:
+    """
+    :return: best time in seconds, peak memory in MB and the result
+    """
+    reader = QRCReader(None, reduced)
+    best = float('inf')
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = reader.decode(image)
+        best = min(best, time.perf_counter() - started_at)
+    tracemalloc.start()
+    reader.decode(image)
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of QR decoding of receipt photos")
+    parser.add_argument('paths', nargs='*', default=[str(TEST_IMAGES)], help="images or directories with them")
+    parser.add_argument('--repeat', type=int, default=3, help="decodings of every image, the best time is taken")
+    args = parser.parse_args()
+
+    totals = {False: [0.0, 0.0, 0], True: [0.0, 0.0, 0]}
+    print(f"{'image':<30}{'mode':<9}{'time, s':>9}{'peak, MB':>10}  stage")
+    for image in iter_images(args.paths):
+        for reduced in (False, True):
+            seconds, peak, result = measure(image, reduced, args.repeat)
+            total = totals[reduced]
+            total[0] += seconds
+            total[1] = max(total[1], peak)
+            total[2] += bool(result.qrcodes)
+            print(f"{image.name[:29]:<30}{'reduced' if reduced else 'full':<9}{seconds:>9.3f}{peak:>10.1f}  "
+                  f"{result.stage or 'failed'}")
+    for reduced, (seconds, peak, decoded) in totals.items():
+        print(f"{'total':<30}{'reduced' if reduced else 'full':<9}{seconds:>9.3f}{peak:>10.1f}  decoded: {decoded}")
+
+
+if __name__ == '__main__':
+    main()
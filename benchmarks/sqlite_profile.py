@@ -0,0 +1,117 @@
+"""
+Benchmark of SQLite connection profile: only foreign_keys (as before) against DBSettings.PRAGMAS.
+Every profile gets a new database file, commits are small transactions like GUI saves,
+reads are aggregate queries run by a reader thread while a writer commits, like GUI during import.
+Run: python -m benchmarks.sqlite_profile --commits 500 --rows 50000 --queries 200
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import Engine, create_engine, event, func, insert, select
+
+from src.settings import settings
+from src.storage.base import Base, set_pragmas
+from src.storage.models import CategoryORM, ProductORM
+
+PROFILES: dict[str, dict[str, str | int]] = {
+    'default': {'foreign_keys': 'true'},
+    'tuned': settings.db.PRAGMAS,
+}
+
+
+def make_engine(path: Path, pragmas: dict[str, str | int]) -> Engine:
+    engine = create_engine(f"sqlite:///{path}", connect_args={'cached_statements': settings.db.CACHED_STATEMENTS})
+    event.listen(engine, "connect", lambda dbapi_connection, connection_record: set_pragmas(dbapi_connection, pragmas))
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(CategoryORM), [{'name': f"category {i}"} for i in range(1, 21)])
+    return engine
+
+
+def commits(engine: Engine, count: int) -> float:
+    """Transaction per row, returns rows/sec"""
+    started_at = time.perf_counter()
+    for i in range(count):
+        with engine.begin() as conn:
+            conn.execute(insert(ProductORM).values(name=f"commit {i}", category_id=i % 20 + 1))
+    return count / (time.perf_counter() - started_at)
+
+
+def bulk_insert(engine: Engine, rows: int, batch_size: int = 1000) -> float:
+    """Transaction per batch, returns rows/sec"""
+    started_at = time.perf_counter()
+    for start in range(0, rows, batch_size):
+        with engine.begin() as conn:
+            conn.execute(insert(ProductORM), [{'name': f"bulk {i}", 'provider_inn': i, 'category_id': i % 20 + 1}
+                                              for i in range(start, min(start + batch_size, rows))])
+    return rows / (time.perf_counter() - started_at)
+
+
+def query(engine: Engine) -> None:
+    stmt = (select(CategoryORM.name, func.count(ProductORM.id), func.sum(ProductORM.provider_inn))
+            .join(ProductORM, ProductORM.category_id == CategoryORM.id)
+            .group_by(CategoryORM.id))
+    with engine.connect() as conn:
+        conn.execute(stmt).all()
+
+
+def queries(engine: Engine, count: int) -> float:
+    """Returns queries/sec"""
+    started_at = time.perf_counter()
+    for _ in range(count):
+        query(engine)
+    return count / (time.perf_counter() - started_at)
+
+
+def concurrent(engine: Engine, count: int) -> tuple[float, float, float]:
+    """
+    Reader thread runs queries while the writer commits
+    :return: commits/sec, queries/sec and max latency of a query in ms
+    """
+    done = threading.Event()
+    latencies: list[float] = []
+
+    def reader():
+        while not done.is_set():
+            started_at = time.perf_counter()
+            query(engine)
+            latencies.append(time.perf_counter() - started_at)
+
+    thread = threading.Thread(target=reader)
+    started_at = time.perf_counter()
+    thread.start()
+    for i in range(count):
+        with engine.begin() as conn:
+            conn.execute(insert(ProductORM).values(name=f"concurrent {i}", category_id=i % 20 + 1))
+    done.set()
+    thread.join()
+    elapsed = time.perf_counter() - started_at
+    return count / elapsed, len(latencies) / elapsed, max(latencies, default=0) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of SQLite connection profile")
+    parser.add_argument('--commits', type=int, default=500, help="transactions of one row")
+    parser.add_argument('--rows', type=int, default=50000, help="rows of bulk insert")
+    parser.add_argument('--queries', type=int, default=200, help="aggregate queries")
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'commits/s':>12}{'bulk rows/s':>14}{'queries/s':>12}"
+          f"{'mixed commits/s':>18}{'mixed queries/s':>18}{'max query ms':>15}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, pragmas in PROFILES.items():
+            engine = make_engine(Path(directory) / f"{name}.sqlite3", pragmas)
+            row = (commits(engine, args.commits),
+                   bulk_insert(engine, args.rows),
+                   queries(engine, args.queries),
+                   *concurrent(engine, args.commits))
+            engine.dispose()
+            print(f"{name:<10}{row[0]:>12.0f}{row[1]:>14.0f}{row[2]:>12.1f}"
+                  f"{row[3]:>18.0f}{row[4]:>18.1f}{row[5]:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
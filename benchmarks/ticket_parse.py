@@ -0,0 +1,95 @@
+"""
+Benchmark of tickets json parsing: TicketParser per receipt against the batch validation of arrays
+by one TypeAdapter call (dropped from src, it was 0.8-0.9x of the per receipt speed)
+and the fast path of receipts.fast_parse.
+Run: python -m benchmarks.ticket_parse --receipts 1000 --items 100
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from pydantic import TypeAdapter, ValidationError, WrapValidator
+from pydantic_core.core_schema import ValidationInfo, ValidatorFunctionWrapHandler
+from typing_extensions import Annotated
+
+from src.receipts.fast_parse import parse_ticket_fast
+from src.receipts.json_parse import TicketParser
+
+TICKET_FILE = Path(__file__).parent.parent / "tests/data/after_parser.json"
+
+
+def make_payloads(count: int, items: int) -> list[str]:
+    with open(TICKET_FILE, encoding='utf-8') as file:
+        ticket = json.load(file)
+    receipt = ticket['ticket']['document']['receipt']
+    receipt['items'] = (receipt['items'] * items)[:items]
+    payloads = []
+    for i in range(count):
+        ticket['id'] = f"{i:024x}"
+        ticket['qr'] = f"t=20240211T1400&s=411.70&fn=7284440700373884&i={i}&fp=1152442848&n=1"
+        payloads.append(json.dumps(ticket, ensure_ascii=False))
+    return payloads
+
+
+def per_receipt(payloads: list[str]) -> list[TicketParser]:
+    return [TicketParser.model_validate_json(payload) for payload in payloads]
+
+
+def keep_error(v: Any, handler: ValidatorFunctionWrapHandler, info: ValidationInfo) -> TicketParser | ValidationError:
+    """
+    Validate one ticket of the array, the raw json of the ticket is taken by the index from the context
+    """
+    context: dict[str, Any] = info.context or {}
+    context['json_'] = context['payloads'][context['index']]
+    context['index'] += 1
+    try:
+        return handler(v)
+    except ValidationError as e:
+        return e
+
+
+tickets_adapter = TypeAdapter(list[Annotated[TicketParser, WrapValidator(keep_error)]])
+
+
+def batch(payloads: list[str], chunk_size: int = 16) -> list[TicketParser | ValidationError]:
+    """Arrays of chunk_size tickets, one call of pydantic for every array"""
+    result: list[TicketParser | ValidationError] = []
+    for i in range(0, len(payloads), chunk_size):
+        chunk = payloads[i:i + chunk_size]
+        result += tickets_adapter.validate_json('[' + ','.join(chunk) + ']',
+                                                context={'payloads': chunk, 'index': 0})
+    return result
+
+
+def fast_path(payloads: list[str]) -> list:
+    return [parse_ticket_fast(payload) for payload in payloads]
+
+
+def measure(name: str, parse: Callable[[list[str]], list], payloads: list[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(payloads)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<14} receipts/sec: {len(payloads) / best:>10.1f}  best of {repeat}: {best * 1000:>8.1f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--receipts', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=20, help="purchases in every receipt")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.receipts, args.items)
+    base = measure('per receipt', per_receipt, payloads, args.repeat)
+    for name, parse in [('batch', batch), ('fast path', fast_path)]:
+        elapsed = measure(name, parse, payloads, args.repeat)
+        print(f"{'':<14} speedup: {base / elapsed:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
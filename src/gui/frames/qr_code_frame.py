@@ -1,12 +1,15 @@
+import logging
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from tkinter import *
 from tkinter import ttk
 from tkinter.filedialog import askopenfilename
 
 from ..tools import win_icons as icon
-from ...receipts.utils import get_qr_code, replace_file
+from ...receipts.utils import ScanResult, get_qr_code, replace_file, scan_qr_images
 from ...settings import settings
+from ...storage.models import QRCodeORM
 from ...storage.repository import QRCodeStorage
 
 if settings.QR_IMAGES_DIR is not None:
@@ -14,6 +17,13 @@ if settings.QR_IMAGES_DIR is not None:
 else:
     QR_IMAGES_DIR = Path(__file__).resolve().parent
 
+SCAN_POLL_MS = 100  # check of the scan of the images directory
+
+logger = logging.getLogger(__name__)
+
+# the images directory is scanned out of the GUI thread, the window is not frozen
+scan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='qr_scan')
+
 
 class QRCodeFrame(ttk.Frame):
     def __init__(self, master):
@@ -22,6 +32,7 @@ class QRCodeFrame(ttk.Frame):
         self.qr_code = StringVar()
         self.error = StringVar()
         self.tickets = StringVar()
+        self.scan: Future[ScanResult] | None = None
 
         self.qr_code.trace_add('write', self.change_qr_code)
 
@@ -39,10 +50,12 @@ class QRCodeFrame(ttk.Frame):
         ttk.Label(self, text="QR Code", font=14).grid(row=0, column=0)
         ttk.Entry(self, width=60, textvariable=self.qr_code).grid(row=0, column=1, sticky='ns')
         ttk.Button(self, image=self.image_ico, command=self.get_from_img).grid(row=0, column=2)
+        self.dir_button = ttk.Button(self, text="Папка", command=self.get_from_dir)
+        self.dir_button.grid(row=0, column=3)
         ttk.Label(self, textvariable=self.error, foreground="red").grid(row=1, column=1, sticky='w')
 
         self.unsaved_tickets = Listbox(self, listvariable=self.tickets)
-        self.unsaved_tickets.grid(row=2, column=0, columnspan=3, sticky='nsew')
+        self.unsaved_tickets.grid(row=2, column=0, columnspan=4, sticky='nsew')
 
         self.unsaved_tickets.bind("<<ListboxSelect>>", self.unsaved_ticket_selection)
 
@@ -63,6 +76,34 @@ class QRCodeFrame(ttk.Frame):
 
         self.update_value(qr)
 
+    def get_from_dir(self):
+        if self.scan is not None:
+            return
+        self.dir_button.state(['disabled'])
+        self.scan = scan_executor.submit(scan_qr_images, QR_IMAGES_DIR)
+        self.after(SCAN_POLL_MS, self.check_scan)
+
+    def check_scan(self):
+        """
+        Show the result of the scan of the images directory, it is polled in the GUI thread by after()
+        """
+        if self.scan is None:
+            return
+        if not self.scan.done():
+            self.after(SCAN_POLL_MS, self.check_scan)
+            return
+        scan, self.scan = self.scan, None
+        self.dir_button.state(['!disabled'])
+        try:
+            result = scan.result()
+        except Exception:
+            logger.exception('')
+            self.error.set("Ошибка чтения папки с изображениями")
+            return
+        if result.failed:
+            self.error.set(f"QR код не распознан в {len(result.failed)} файлах, попробуйте другие...")
+        self.update_value()
+
     def set(self, qr: str):
         self.qr_code.set(qr)
 
@@ -77,7 +118,7 @@ class QRCodeFrame(ttk.Frame):
         self.error.set('')
 
     def update_value(self, qr: str = None):
-        tickets = [obj.qr for obj in QRCodeStorage.list(filter_by={'json_': None})]
+        tickets = [row.qr for row in QRCodeStorage.list(filter_by={'json_': None}, columns=[QRCodeORM.qr])]
         if qr is not None and qr in tickets:
             self.qr_code.set(qr)
         else:
@@ -3,9 +3,10 @@ from tkinter import ttk
 
 from ..tools import win_icons as icon
 from ..dialogs.askdialogs import askstring
-from ...receipts.json_parse import TicketParser
+from ...receipts.fast_parse import parse_ticket
+from ...storage.cache import product_cache
 from ...storage.models import TicketORM
-from ...storage.repository import ProductStorage, CategoryStorage
+from ...storage.repository import CategoryStorage
 
 
 class TicketFrame(ttk.Frame):
@@ -75,16 +76,13 @@ class TicketFrame(ttk.Frame):
             self.set_categories()
 
     def init_data(self, ticket_json: str):
-        ticket_parser = TicketParser.model_validate_json(ticket_json)
+        ticket_parser = parse_ticket(ticket_json)
         self.ticket_orm = TicketORM.from_pydantic(ticket_parser)
         self.items = self.ticket_orm.purchases
+        products = product_cache.products(item.product.name for item in self.items)
         for item in self.items:
-            filter = {
-                'name': item.product.name
-            }
-            product = ProductStorage.list(filter_by=filter)
-            if product:
-                item.product = product[0]
+            if item.product.name in products:
+                item.product = products[item.product.name]
 
     @staticmethod
     def format(s: str) -> str:
@@ -3,6 +3,7 @@ from tkinter import *
 from tkinter import ttk, messagebox
 
 from ..settings import settings
+from ..storage.migrations import migrate
 from .frames.receipts_frame import ReceiptFrame
 
 logger = logging.getLogger(__name__)
@@ -10,6 +11,8 @@ logger = logging.getLogger(__name__)
 
 def run(root: Tk | None = None):
     try:
+        # tables added by new versions, e.g. ticket_ids, are created in the existing database
+        migrate()
         if root is None:
             root = Tk()
             root.tk.call('lappend', 'auto_path', settings.GUI_THEME_PATH)
@@ -0,0 +1,258 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Sequence
+
+import httpx
+from pydantic import validate_call
+
+from .exceptions import NalogAuthError
+from .metrics import RequestStats, httpx_trace, record_request
+from .nalog_api import (API_URL, session_headers, check_ticket_response, logger, rate_limiter, SessionTokens, OS,
+                        INN_AUTH_PATH, SMS_AUTH_PATH, SMS_VERIFY_AUTH_PATH,
+                        TICKET_ID_PATH, TICKET_DETAILS_PATH, REFRESH_AUTHORIZATION_PATH)
+from .throttling import RETRY_STATUS_CODES, TokenBucket, backoff_delay
+from ..settings import settings
+
+async_auth_methods = {}
+
+
+class AsyncNalogClient:
+    """
+    Asynchronous HTTP client for 'rkkt_nalog' service with a pool of keep-alive connections
+    :param base_url: scheme and address of the service
+    :param pool_size: max number of connections kept open to the service
+    :param timeout: default timeout (seconds) for every request
+    :param keep_alive: reuse connections between requests
+    :param rate_limiter: limiter of requests rate, may be shared between clients
+    :param retries: number of repeats on 429/5xx responses and connection errors,
+     requests which are not idempotent (auth, refresh, sms) are repeated only if the connection failed
+    :param backoff: base delay (seconds) of exponential backoff between repeats
+    :param backoff_max: max delay (seconds) between repeats
+    :param hooks: called with timings of every call, e.g. metrics.record_request
+    """
+
+    def __init__(self, *, base_url: str = API_URL,
+                 pool_size: int = 10, timeout: float = 10.0, keep_alive: bool = True,
+                 rate_limiter: TokenBucket | None = None, retries: int = 0,
+                 backoff: float = 0.5, backoff_max: float = 30.0,
+                 hooks: Sequence[Callable[[RequestStats], None]] = ()):
+        self.base_url = base_url.rstrip('/')
+        self.rate_limiter = rate_limiter
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hooks = list(hooks)
+        self.limits = httpx.Limits(max_connections=pool_size,
+                                   max_keepalive_connections=pool_size if keep_alive else 0)
+        self.timeout = timeout
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        httpx client of the running event loop, it is created lazily because
+        connections of a closed loop (e.g. of the previous asyncio.run) can't be reused
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+            self._loop = loop
+        return self._client
+
+    async def post(self, path: str, *, session_id: str | None = None, idempotent: bool = True,
+                   **kwargs) -> httpx.Response:
+        """
+        :param idempotent: the request may be repeated after a response or a broken connection,
+         otherwise only if the connection to the service was not established
+        """
+        return await self._send('POST', self.client.post, path, session_id, idempotent, **kwargs)
+
+    async def get(self, path: str, *, session_id: str | None = None, **kwargs) -> httpx.Response:
+        return await self._send('GET', self.client.get, path, session_id, True, **kwargs)
+
+    async def _send(self, method: str, send: Callable[..., Awaitable[httpx.Response]], path: str,
+                    session_id: str | None, idempotent: bool, **kwargs) -> httpx.Response:
+        if not self.hooks:
+            return await self._send_with_retries(send, path, session_id, idempotent, None, **kwargs)
+
+        stats = RequestStats(method, path)
+        kwargs['extensions'] = kwargs.get('extensions', {}) | {'trace': httpx_trace(stats)}
+        try:
+            resp = await self._send_with_retries(send, path, session_id, idempotent, stats, **kwargs)
+            stats.status = resp.status_code
+            stats.size = len(resp.content)
+            return resp
+        finally:
+            stats.total = time.perf_counter() - stats.started_at
+            for hook in self.hooks:
+                hook(stats)
+
+    async def _send_with_retries(self, send: Callable[..., Awaitable[httpx.Response]], path: str,
+                                 session_id: str | None, idempotent: bool, stats: RequestStats | None,
+                                 **kwargs) -> httpx.Response:
+        url = self.base_url + path
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+            retry_after = None
+            try:
+                resp = await send(url, headers=session_headers(session_id), **kwargs)
+            except httpx.TransportError as exc:
+                # the request was not sent on connect errors, it's safe to repeat any request
+                if attempt >= self.retries or not (idempotent or isinstance(exc, (httpx.ConnectError,
+                                                                                  httpx.ConnectTimeout))):
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUS_CODES or not idempotent or attempt >= self.retries:
+                    return resp
+                retry_after = resp.headers.get('Retry-After')
+            await asyncio.sleep(backoff_delay(attempt, self.backoff, self.backoff_max, retry_after))
+            attempt += 1
+            if stats is not None:
+                stats.retries = attempt
+                stats.dns = stats.connect = stats.tls = None
+
+    async def aclose(self) -> None:
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = self._loop = None
+
+    async def __aenter__(self) -> 'AsyncNalogClient':
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+
+client = AsyncNalogClient(base_url=settings.NALOG_API_URL,
+                          pool_size=settings.NALOG_POOL_SIZE,
+                          timeout=settings.NALOG_TIMEOUT,
+                          keep_alive=settings.NALOG_KEEP_ALIVE,
+                          rate_limiter=rate_limiter,
+                          retries=settings.NALOG_RETRIES,
+                          backoff=settings.NALOG_BACKOFF,
+                          backoff_max=settings.NALOG_BACKOFF_MAX,
+                          hooks=[record_request] if settings.NALOG_METRICS else [])
+
+
+def register(func: Callable) -> Callable:
+    async_auth_methods[func.__name__] = func
+    return func
+
+
+@register
+@validate_call
+async def inn(inn: str, password: str, client_secret: str) -> SessionTokens:
+    payload = {
+        'inn': inn,
+        'client_secret': client_secret,
+        'password': password
+    }
+
+    resp = await client.post(INN_AUTH_PATH, json=payload, idempotent=False)
+
+    if resp.status_code != 200:
+        raise NalogAuthError(resp)
+
+    return SessionTokens(session_id=resp.json()['sessionId'],
+                         refresh_token=resp.json()['refresh_token'])
+
+
+@register
+@validate_call
+async def sms(phone: str, input_interface: Callable[[str], str], client_secret: str) -> SessionTokens:
+    payload = {
+        'phone': phone,
+        'client_secret': client_secret,
+        'os': OS
+    }
+
+    resp = await client.post(SMS_AUTH_PATH, json=payload, idempotent=False)
+
+    if resp.status_code != 204:
+        raise NalogAuthError(resp)
+
+    payload['code'] = await asyncio.to_thread(input_interface, "СМС код:")
+    resp = await client.post(SMS_VERIFY_AUTH_PATH, json=payload, idempotent=False)
+
+    if resp.status_code != 200:
+        raise NalogAuthError(resp)
+
+    return SessionTokens(session_id=resp.json()['sessionId'],
+                         refresh_token=resp.json()['refresh_token'])
+
+
+async def async_authorization(method: str, *args, **kwargs) -> SessionTokens | None:
+    if method not in async_auth_methods:
+        raise ValueError(f"Authorization method {method!r} not implementation")
+    try:
+        return await async_auth_methods[method](*args, **kwargs)
+    except Exception:
+        logger.exception("")
+
+
+@validate_call
+async def async_refresh_session(*, session_id: str,
+                                refresh_token: str,
+                                client_secret: str) -> SessionTokens | None:
+    payload = {
+        'refresh_token': refresh_token,
+        'client_secret': client_secret
+    }
+
+    try:
+        resp = await client.post(REFRESH_AUTHORIZATION_PATH, json=payload, session_id=session_id,
+                                 idempotent=False)
+        if resp.status_code != 200:
+            raise NalogAuthError(resp)
+        return SessionTokens(session_id=resp.json()['sessionId'],
+                             refresh_token=resp.json()['refresh_token'])
+    except Exception:
+        logger.exception("")
+
+
+async def _async_get_ticket_id(qr: str, session_id: str) -> str:
+    payload = {'qr': qr}
+
+    resp = await client.post(TICKET_ID_PATH, json=payload, session_id=session_id)
+    check_ticket_response(resp, qr)
+
+    return resp.json()['id']
+
+
+@validate_call
+async def async_get_ticket_id_api(qr: str, session_id: str) -> str | None:
+    """
+    Get ticket id by info from qr code
+    :raise NalogAuthError: session is expired or invalid, other errors are logged
+    """
+    try:
+        return await _async_get_ticket_id(qr, session_id)
+    except NalogAuthError:
+        raise
+    except Exception:
+        logger.exception("")
+
+
+@validate_call
+async def async_get_ticket_api(qr: str, session_id: str, ticket_id: str | None = None) -> str | None:
+    """
+    Get ticket json by info from qr code
+    :param ticket_id: already known ticket id, the request of ticket id is skipped
+    :raise NalogAuthError: session is expired or invalid, other errors are logged
+    """
+    try:
+        if ticket_id is None:
+            ticket_id = await _async_get_ticket_id(qr, session_id)
+        path = TICKET_DETAILS_PATH % ticket_id
+
+        resp = await client.get(path, session_id=session_id)
+        check_ticket_response(resp, qr)
+
+        return resp.text
+    except NalogAuthError:
+        raise
+    except Exception:
+        logger.exception("")
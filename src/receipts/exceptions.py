@@ -1,14 +1,20 @@
 __all__ = []  # type: ignore
 
+import httpx
 from requests import Response
 
 
 class NalogAPIError(Exception):
     msg = "%s, status code: %s, message response: %s"
 
-    def __init__(self, resp: Response, **kwargs):
+    def __init__(self, resp: Response | httpx.Response, **kwargs):
         self.args = (self.msg % (resp.url, resp.status_code, resp.text) +
                      f"\n\tData: {kwargs}\n",)
 
 
 class NalogAuthError(NalogAPIError): ...
+
+
+class TicketNotReceivedError(Exception):
+    def __init__(self, qr: str):
+        self.args = (f"Ticket not received, qr: {qr}",)
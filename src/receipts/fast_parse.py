@@ -0,0 +1,154 @@
+"""
+Fast path of tickets json parsing for well-formed payloads of 'rkkt_nalog' service.
+Records are built straight from the decoded json, TicketParser is used only when the payload is malformed.
+"""
+import json
+from decimal import Decimal
+from typing import Any
+
+from .json_parse import TicketParser
+from ..settings import settings
+
+
+class Record:
+    """Plain record with the subset of pydantic API used by Base.from_pydantic"""
+    __slots__: tuple[str, ...] = ()
+    model_fields: tuple[str, ...] = ()
+
+    def __init__(self, *args: Any):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+
+    def model_dump(self, *, exclude: set[str] | None = None) -> dict[str, Any]:
+        exclude = exclude or set()
+        return {name: dump(getattr(self, name)) for name in self.__slots__ if name not in exclude}
+
+    def __eq__(self, other: object) -> bool:
+        return type(self) is type(other) and self.model_dump() == other.model_dump()  # type: ignore[attr-defined]
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+def dump(value: Any) -> Any:
+    if isinstance(value, Record):
+        return value.model_dump()
+    if isinstance(value, list):
+        return [dump(item) for item in value]
+    return value
+
+
+class QRCodeRecord(Record):
+    __slots__ = model_fields = ('qr', 'json_')
+    qr: str
+    json_: str
+
+
+class StorageRecord(Record):
+    __slots__ = model_fields = ('name', 'inn', 'place', 'address')
+    name: str
+    inn: int
+    place: str | None
+    address: str | None
+
+
+class ProductRecord(Record):
+    __slots__ = model_fields = ('name', 'provider_inn')
+    name: str
+    provider_inn: int | None
+
+
+class PurchaseRecord(Record):
+    __slots__ = model_fields = ('product', 'price', 'quantity', 'sum')
+    product: ProductRecord
+    price: int
+    quantity: Decimal
+    sum: int
+
+
+class TicketRecord(Record):
+    __slots__ = model_fields = ('id', 'qr_code', 'storage', 'date_time', 'purchases', 'total_sum')
+    id: str
+    qr_code: QRCodeRecord
+    storage: StorageRecord
+    date_time: int
+    purchases: list[PurchaseRecord]
+    total_sum: int
+
+
+class MalformedTicket(Exception):
+    pass
+
+
+def as_int(value: Any) -> int:
+    if type(value) is int:
+        return value
+    if type(value) is str and (value := value.strip()).isdigit():
+        return int(value)
+    raise MalformedTicket(value)
+
+
+def as_str(value: Any) -> str:
+    if type(value) is not str:
+        raise MalformedTicket(value)
+    return value
+
+
+def as_optional_str(value: Any) -> str | None:
+    return None if value is None else as_str(value)
+
+
+def as_quantity(value: Any) -> Decimal:
+    if type(value) is int or type(value) is Decimal:
+        return Decimal(value)
+    raise MalformedTicket(value)
+
+
+def build_ticket(data: dict[str, Any], json_: str) -> TicketRecord:
+    """
+    Build ticket record from the decoded json, floats must be decoded as Decimal
+    :raise MalformedTicket, KeyError, TypeError: a field is missing or malformed
+    """
+    receipt = data['ticket']['document']['receipt']
+    purchases = []
+    for item in receipt['items']:
+        provider_inn = item.get('providerInn')
+        product = ProductRecord(as_str(item['name']),
+                                None if provider_inn is None else as_int(provider_inn))
+        purchases.append(PurchaseRecord(product,
+                                        as_int(item['price']),
+                                        as_quantity(item['quantity']),
+                                        as_int(item['sum'])))
+    storage = StorageRecord(as_str(receipt['user']),
+                            as_int(receipt['userInn']),
+                            as_optional_str(receipt.get('retailPlace')),
+                            as_optional_str(receipt.get('retailPlaceAddress')))
+    return TicketRecord(as_str(data['id']),
+                        QRCodeRecord(as_str(data['qr']), json_),
+                        storage,
+                        as_int(receipt['dateTime']),
+                        purchases,
+                        as_int(receipt['totalSum']))
+
+
+def parse_ticket_fast(json_data: str | bytes) -> TicketRecord | TicketParser:
+    """
+    Parse ticket json by the fast path, falls back to TicketParser if the payload is malformed
+    :raise ValidationError: the payload is invalid for TicketParser too
+    """
+    json_ = json_data if isinstance(json_data, str) else json_data.decode('utf-8')
+    try:
+        return build_ticket(json.loads(json_, parse_float=Decimal), json_)
+    except (MalformedTicket, KeyError, TypeError, ValueError):
+        return TicketParser.model_validate_json(json_data)
+
+
+def parse_ticket(json_data: str | bytes) -> TicketRecord | TicketParser:
+    """
+    Parse ticket json by the parser selected with FAST_TICKET_PARSER setting
+    :param json_data: ticket json, e.g. body of nalog API response
+    """
+    if settings.FAST_TICKET_PARSER:
+        return parse_ticket_fast(json_data)
+    return TicketParser.model_validate_json(json_data)
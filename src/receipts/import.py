@@ -0,0 +1,127 @@
+"""
+Bulk import of tickets json dumps into the database, without GUI.
+Every file is a ticket json (the same as tests/data/after_parser.json) or JSONL with a ticket per line,
+directories are scanned recursively for *.json and *.jsonl.
+Run: python -m src.receipts.import data/tickets.jsonl data/tickets/ --batch-size 500 --category Продукты
+"""
+import argparse
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from .fast_parse import parse_ticket
+from ..storage.base import session_factory
+from ..storage.models import CategoryORM
+from ..storage.repository import TicketStorage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    imported: int = 0
+    purchases: int = 0
+    skipped: int = 0
+    errors: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def __str__(self) -> str:
+        elapsed = self.elapsed
+        rows = self.imported + self.purchases
+        return (f"read: {self.read}  imported: {self.imported}  purchases: {self.purchases}  "
+                f"skipped: {self.skipped}  errors: {self.errors}  "
+                f"time: {elapsed:.2f} s  tickets/sec: {self.imported / elapsed:.1f}  rows/sec: {rows / elapsed:.1f}")
+
+
+def iter_payloads(paths: Iterable[str | Path]) -> Iterator[str]:
+    """
+    Read tickets json from files, JSONL files and directories, files are read lazily
+    :param paths: paths of *.json, *.jsonl files or directories with them
+    """
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from iter_payloads(sorted(p for p in path.rglob('*') if p.suffix in ('.json', '.jsonl')))
+        elif path.suffix == '.jsonl':
+            with open(path, encoding='utf-8') as file:
+                yield from (line for line in map(str.strip, file) if line)
+        else:
+            yield path.read_text(encoding='utf-8')
+
+
+def batched(payloads: Iterable[str], size: int) -> Iterator[list[str]]:
+    batch = []
+    for payload in payloads:
+        batch.append(payload)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_category_id(name: str) -> int:
+    stmt = select(CategoryORM.id).where(CategoryORM.name == name)
+    with session_factory() as session:
+        category_id = session.scalar(stmt)
+        if category_id is None:
+            category_id = session.execute(insert(CategoryORM).values(name=name).returning(CategoryORM.id)).scalar_one()
+            session.commit()
+        return category_id
+
+
+def import_tickets(payloads: Iterable[str], *, category: str = 'Продукты', batch_size: int = 500) -> ImportStats:
+    """
+    Import tickets json into the database, every batch is saved by TicketStorage.save_many in one transaction
+    :param payloads: tickets json, e.g. iter_payloads(paths)
+    :param category: category of new products
+    :param batch_size: tickets in one transaction
+    """
+    stats = ImportStats()
+    category_id = get_category_id(category)
+    for batch in batched(payloads, batch_size):
+        stats.read += len(batch)
+        tickets = []
+        for payload in batch:
+            try:
+                tickets.append(parse_ticket(payload))
+            except ValidationError as e:
+                stats.errors += 1
+                logger.warning("Invalid ticket json: %s", e)
+        try:
+            saved = TicketStorage.save_many(tickets, category_id)
+        except Exception:
+            # the transaction of the batch is rolled back, the next batches are imported
+            stats.errors += len(tickets)
+            logger.exception("Batch of %s tickets is not saved", len(tickets))
+            continue
+        stats.imported += len(saved)
+        stats.skipped += len(tickets) - len(saved)
+        # duplicates of a ticket in the batch are skipped, save_many keeps the first one
+        unique = {ticket.id: ticket for ticket in reversed(tickets)}
+        stats.purchases += sum(len(ticket.purchases) for ticket_id, ticket in unique.items() if ticket_id in saved)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import of tickets json dumps into the database")
+    parser.add_argument('paths', nargs='+', help="*.json, *.jsonl files or directories with them")
+    parser.add_argument('--batch-size', type=int, default=500, help="tickets in one transaction")
+    parser.add_argument('--category', default='Продукты', help="category of new products")
+    args = parser.parse_args()
+
+    stats = import_tickets(iter_payloads(args.paths), category=args.category, batch_size=args.batch_size)
+    print(stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,16 +4,17 @@ __all__ = []  # type: ignore
 
 import json
 from decimal import Decimal
-from typing import Any
+from typing import Any, Iterable, Iterator
 
-from pydantic import BaseModel, Field
-from pydantic.functional_validators import (BeforeValidator,
-                                            WrapValidator,
+from pydantic import AliasPath, BaseModel, Field
+from pydantic.functional_validators import (WrapValidator,
                                             model_validator)
 from pydantic_core import ValidationError
 from pydantic_core.core_schema import ValidatorFunctionWrapHandler, ValidationInfo
 from typing_extensions import Annotated
 
+RECEIPT_PATH = ('ticket', 'document', 'receipt')
+
 
 class QRCodeParser(BaseModel):
     qr: str
@@ -69,33 +70,53 @@ class PurchaseParser(BaseModel):
 class TicketParser(BaseModel):
     id: str
     qr_code: QRCodeParser
-    storage: Annotated[StorageParser, BeforeValidator(TicketParser.get_storage),] = Field(alias="ticket")
-    date_time: Annotated[int, BeforeValidator(TicketParser.get_date)] = Field(alias="ticket")
-    purchases: Annotated[list[PurchaseParser], BeforeValidator(TicketParser.get_purchases)] = Field(alias="ticket")
-    total_sum: Annotated[int, BeforeValidator(TicketParser.get_total_sum)] = Field(alias="ticket")
+    storage: StorageParser = Field(validation_alias=AliasPath(*RECEIPT_PATH))
+    date_time: int = Field(validation_alias=AliasPath(*RECEIPT_PATH, 'dateTime'))
+    purchases: list[PurchaseParser] = Field(validation_alias=AliasPath(*RECEIPT_PATH, 'items'))
+    total_sum: int = Field(validation_alias=AliasPath(*RECEIPT_PATH, 'totalSum'))
+
+    @classmethod
+    def model_validate_json(cls,
+                            json_data: str | bytes | bytearray,
+                            *,
+                            strict: bool | None = None,
+                            context: dict[str, Any] | None = None) -> TicketParser:
+        """
+        Validate ticket json, the raw json is kept as is for qr_code.json_
+        :param json_data: ticket json, e.g. body of nalog API response
+        """
+        context = {'json_': json_data} | (context or {})
+        return super().model_validate_json(json_data, strict=strict, context=context)
 
     @model_validator(mode='before')
     @classmethod
-    def get_qr(cls, data: Any) -> QRCodeParser | dict[str, Any]:
+    def get_qr(cls, data: Any, info: ValidationInfo) -> QRCodeParser | dict[str, Any]:
+        if not isinstance(data, dict):
+            return data
+        raw = (info.context or {}).get('json_')
+        if raw is None:
+            raw = json.dumps(data, ensure_ascii=False)
+        elif not isinstance(raw, str):
+            raw = bytes(raw).decode('utf-8')
         qr_code = {
-            'qr': data['qr'],
-            'json_': json.dumps(data, ensure_ascii=False)
+            'qr': data.get('qr'),
+            'json_': raw
         }
         data['qr_code'] = qr_code
         return data
 
-    @staticmethod
-    def get_date(v: dict[str, Any]) -> int:
-        return v['document']['receipt']['dateTime']
-
-    @staticmethod
-    def get_purchases(v: dict[str, Any]) -> list[dict[str, Any]]:
-        return v['document']['receipt']['items']
-
-    @staticmethod
-    def get_storage(v: dict[str, Any]) -> dict[str, Any]:
-        return v['document']['receipt']
 
-    @staticmethod
-    def get_total_sum(v: dict[str, Any]) -> int:
-        return v['document']['receipt']['totalSum']
+def parse_tickets(payloads: Iterable[str | bytes]) -> Iterator[TicketParser | ValidationError | UnicodeDecodeError]:
+    """
+    Validate many tickets json lazily, payloads are read while the results are taken
+    :param payloads: tickets json, e.g. lines of JSONL file
+    :return: parsed ticket or error (validation or decoding) for every payload, blank payloads are errors too
+    """
+    for payload in payloads:
+        result: TicketParser | ValidationError | UnicodeDecodeError
+        try:
+            raw = (payload if isinstance(payload, str) else payload.decode('utf-8')).strip()
+            result = TicketParser.model_validate_json(raw)
+        except (ValidationError, UnicodeDecodeError) as e:
+            result = e
+        yield result
@@ -0,0 +1,280 @@
+import json
+import re
+import socket
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.connection import allowed_gai_family
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+TICKET_ID_RE = re.compile(r"/[0-9a-f]{24}$")
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), value: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def samples(self) -> list[dict[str, Any]]:
+        return [{'labels': dict(labels), 'value': value} for labels, value in self.values.items()]
+
+    def prometheus(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{format_labels(labels)} {value}" for labels, value in self.values.items()]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values: dict[Labels, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        counts, total, count = self.values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.values[labels] = (counts, total + value, count + 1)
+
+    def samples(self) -> list[dict[str, Any]]:
+        return [{'labels': dict(labels),
+                 'buckets': dict(zip([*map(str, self.buckets), '+Inf'], cumulative(counts))),
+                 'sum': total,
+                 'count': count}
+                for labels, (counts, total, count) in self.values.items()]
+
+    def prometheus(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in self.values.items():
+            for le, value in zip([*map(str, self.buckets), '+Inf'], cumulative(counts)):
+                lines.append(f"{self.name}_bucket{format_labels(labels + (('le', le),))} {value}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process registry of counters and histograms, dumped as JSON or Prometheus text format"""
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        metric = self.metrics.setdefault(name, Counter(name, help))
+        assert isinstance(metric, Counter)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = DURATION_BUCKETS) -> Histogram:
+        metric = self.metrics.setdefault(name, Histogram(name, help, buckets))
+        assert isinstance(metric, Histogram)
+        return metric
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1) -> None:
+        with self._lock:
+            metric = self.metrics[name]
+            assert isinstance(metric, Counter)
+            metric.inc(labels, value)
+
+    def observe(self, name: str, value: float, labels: Labels = ()) -> None:
+        with self._lock:
+            metric = self.metrics[name]
+            assert isinstance(metric, Histogram)
+            metric.observe(value, labels)
+
+    def clear(self) -> None:
+        with self._lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+
+    def to_json(self) -> str:
+        with self._lock:
+            data = {name: {'type': type(metric).__name__.lower(),
+                           'help': metric.help,
+                           'samples': metric.samples()}
+                    for name, metric in self.metrics.items()}
+        return json.dumps(data, ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            lines = [line for metric in self.metrics.values() for line in metric.prometheus()]
+        return '\n'.join(lines) + '\n'
+
+
+def cumulative(counts: list[int]) -> list[int]:
+    result, total = [], 0
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+@dataclass
+class RequestStats:
+    """
+    Timings (seconds) of one call of nalog API, ttfb is counted from sending the request
+    to receiving the response headers. httpx doesn't trace DNS resolution,
+    so dns is None for the async client and its connect includes DNS resolution
+    """
+    method: str
+    path: str
+    status: int | None = None
+    dns: float | None = None
+    connect: float | None = None
+    tls: float | None = None
+    ttfb: float | None = None
+    total: float = 0.0
+    size: int = 0
+    retries: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def endpoint(self) -> str:
+        return TICKET_ID_RE.sub('/{id}', self.path)
+
+
+registry = MetricsRegistry()
+registry.counter('nalog_requests_total', "Calls of nalog API")
+registry.counter('nalog_retries_total', "Repeated requests to nalog API")
+registry.histogram('nalog_request_seconds', "Total time of nalog API call, including retries")
+registry.histogram('nalog_dns_seconds', "Time of DNS resolution")
+registry.histogram('nalog_connect_seconds', "Time of TCP connect, including DNS resolution for the async client")
+registry.histogram('nalog_tls_seconds', "Time of TLS handshake")
+registry.histogram('nalog_ttfb_seconds', "Time to the first byte of response")
+registry.histogram('nalog_response_bytes', "Size of response body", SIZE_BUCKETS)
+
+
+def record_request(stats: RequestStats) -> None:
+    """Hook of nalog API clients, which collects request stats in the registry"""
+    endpoint = (('endpoint', stats.endpoint),)
+    registry.inc('nalog_requests_total', endpoint + (('method', stats.method), ('status', str(stats.status))))
+    if stats.retries:
+        registry.inc('nalog_retries_total', endpoint, stats.retries)
+    registry.observe('nalog_request_seconds', stats.total, endpoint)
+    if stats.dns is not None:
+        registry.observe('nalog_dns_seconds', stats.dns, endpoint)
+    if stats.connect is not None:
+        registry.observe('nalog_connect_seconds', stats.connect, endpoint)
+    if stats.tls is not None:
+        registry.observe('nalog_tls_seconds', stats.tls, endpoint)
+    if stats.ttfb is not None:
+        registry.observe('nalog_ttfb_seconds', stats.ttfb, endpoint)
+    registry.observe('nalog_response_bytes', stats.size, endpoint)
+
+
+# stats of the request sent by the current thread, connections write their timings here
+current_request = threading.local()
+
+
+def _current_stats() -> RequestStats | None:
+    return getattr(current_request, 'stats', None)
+
+
+def timed_new_conn(conn: HTTPConnection, new_conn: Callable[[], socket.socket]) -> socket.socket:
+    """
+    Open the socket of the connection, DNS resolution and TCP connect are timed separately:
+    the host is resolved here and resolved addresses are connected one by one, as urllib3 does
+    :param new_conn: _new_conn of urllib3
+    """
+    stats = _current_stats()
+    if stats is None:
+        return new_conn()
+    dns_host = conn._dns_host
+    start = time.perf_counter()
+    try:
+        addresses = [address[4][0] for address in
+                     socket.getaddrinfo(dns_host.strip('[]'), conn.port, allowed_gai_family(), socket.SOCK_STREAM)]
+    except (OSError, UnicodeError):
+        # urllib3 raises its error of the failed resolution
+        addresses = [dns_host]
+    resolved_at = time.perf_counter()
+    try:
+        for i, address in enumerate(addresses):
+            conn._dns_host = address
+            try:
+                sock = new_conn()
+                break
+            except Exception:
+                if i == len(addresses) - 1:
+                    raise
+    finally:
+        conn._dns_host = dns_host
+    stats.dns = resolved_at - start
+    stats.connect = time.perf_counter() - resolved_at
+    return sock
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        return timed_new_conn(self, super()._new_conn)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        return timed_new_conn(self, super()._new_conn)
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        if (stats := _current_stats()) is not None and stats.connect is not None:
+            stats.tls = time.perf_counter() - start - (stats.dns or 0) - stats.connect
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose new connections report DNS resolution, connect and TLS handshake time"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool,
+                                                   'https': TimedHTTPSConnectionPool}
+
+
+def httpx_trace(stats: RequestStats) -> Callable[[str, dict], Awaitable[None]]:
+    """
+    Trace extension of httpx, which writes connect, TLS handshake and ttfb time to stats
+    :param stats: stats of the request
+    """
+    started: dict[str, float] = {}
+
+    async def trace(event: str, info: dict) -> None:
+        step, _, state = event.rpartition('.')
+        now = time.perf_counter()
+        if state == 'started':
+            started[step] = now
+        elif step == 'connection.connect_tcp' and state == 'complete':
+            stats.connect = now - started[step]
+        elif step == 'connection.start_tls' and state == 'complete':
+            stats.tls = now - started[step]
+        elif step.endswith('.receive_response_headers') and state == 'complete':
+            step = step.replace('receive_response_headers', 'send_request_headers')
+            stats.ttfb = now - started.get(step, now)
+
+    return trace
@@ -2,12 +2,19 @@
 # https://github.com/valiotti/get-receipts
 # https://ofd.ru/razrabotchikam/cheki-i-kkt?ysclid=lsnehegx2j884168438
 import logging
-from typing import Callable, NamedTuple
+import time
+from typing import Callable, NamedTuple, Sequence
 
+import httpx
 import requests
 from pydantic import validate_call
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 
 from .exceptions import NalogAuthError, NalogAPIError
+from .metrics import RequestStats, TimedHTTPAdapter, current_request, record_request
+from .throttling import RETRY_STATUS_CODES, TokenBucket, backoff_delay
+from ..settings import settings
 
 logger = logging.getLogger(__name__)
 
@@ -21,12 +28,16 @@ OS = 'Android'
 
 # API 'rkkt_nalog' service
 HOST = 'irkkt-mobile.nalog.ru:8888'
-INN_AUTH_URL = f"https://{HOST}/v2/mobile/users/lkfl/auth"
-SMS_AUTH_URL = f"https://{HOST}/v2/auth/phone/request"
-SMS_VERIFY_AUTH_URL = f"https://{HOST}/v2/auth/phone/verify"
-TICKET_ID_URL = f"https://{HOST}/v2/ticket"
-TICKET_DETAILS_URL = f"https://{HOST}/v2/tickets/%s"
-REFRESH_AUTHORIZATION_URL = f"https://{HOST}/v2/mobile/users/refresh"
+API_URL = f"https://{HOST}"
+INN_AUTH_PATH = "/v2/mobile/users/lkfl/auth"
+SMS_AUTH_PATH = "/v2/auth/phone/request"
+SMS_VERIFY_AUTH_PATH = "/v2/auth/phone/verify"
+TICKET_ID_PATH = "/v2/ticket"
+TICKET_DETAILS_PATH = "/v2/tickets/%s"
+REFRESH_AUTHORIZATION_PATH = "/v2/mobile/users/refresh"
+
+# status codes of requests with an expired or invalid session
+AUTH_ERROR_CODES = (401, 403)
 
 headers = {
     'Host': HOST,
@@ -41,11 +52,145 @@ headers = {
 auth_methods = {}
 
 
+def session_headers(session_id: str | None = None) -> dict[str, str]:
+    """
+    Build headers for one request, the shared headers are never changed
+    :param session_id: id of authorized session, if the request requires it
+    """
+    if session_id is None:
+        return headers.copy()
+    return headers | {'sessionId': session_id}
+
+
+def is_connect_error(exc: requests.RequestException) -> bool:
+    """
+    The request was not sent: connection timeout or refused connection
+    """
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = exc.args[0] if exc.args else None
+    return isinstance(getattr(reason, 'reason', reason), NewConnectionError)
+
+
 class SessionTokens(NamedTuple):
     session_id: str
     refresh_token: str
 
 
+class NalogClient:
+    """
+    HTTP client for 'rkkt_nalog' service with a pool of keep-alive connections
+    :param base_url: scheme and address of the service
+    :param pool_size: max number of connections kept open to the service
+    :param timeout: default timeout (seconds) for every request
+    :param keep_alive: reuse connections between requests
+    :param rate_limiter: limiter of requests rate, may be shared between clients
+    :param retries: number of repeats on 429/5xx responses and connection errors,
+     requests which are not idempotent (auth, refresh, sms) are repeated only if the connection failed
+    :param backoff: base delay (seconds) of exponential backoff between repeats
+    :param backoff_max: max delay (seconds) between repeats
+    :param hooks: called with timings of every call, e.g. metrics.record_request
+    """
+
+    def __init__(self, *, base_url: str = API_URL,
+                 pool_size: int = 10, timeout: float = 10.0, keep_alive: bool = True,
+                 rate_limiter: TokenBucket | None = None, retries: int = 0,
+                 backoff: float = 0.5, backoff_max: float = 30.0,
+                 hooks: Sequence[Callable[[RequestStats], None]] = ()):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hooks = list(hooks)
+        self.session = requests.Session()
+        adapter_class = TimedHTTPAdapter if self.hooks else HTTPAdapter
+        adapter = adapter_class(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+
+    def post(self, path: str, *, session_id: str | None = None, idempotent: bool = True,
+             **kwargs) -> requests.Response:
+        """
+        :param idempotent: the request may be repeated after a response or a broken connection,
+         otherwise only if the connection to the service was not established
+        """
+        return self._send('POST', self.session.post, path, session_id, idempotent, **kwargs)
+
+    def get(self, path: str, *, session_id: str | None = None, **kwargs) -> requests.Response:
+        return self._send('GET', self.session.get, path, session_id, True, **kwargs)
+
+    def _send(self, method: str, send: Callable[..., requests.Response], path: str,
+              session_id: str | None, idempotent: bool, **kwargs) -> requests.Response:
+        if not self.hooks:
+            return self._send_with_retries(send, path, session_id, idempotent, None, **kwargs)
+
+        stats = RequestStats(method, path)
+        current_request.stats = stats
+        try:
+            resp = self._send_with_retries(send, path, session_id, idempotent, stats, **kwargs)
+            stats.status = resp.status_code
+            stats.ttfb = (resp.elapsed.total_seconds() - (stats.dns or 0) - (stats.connect or 0)
+                          - (stats.tls or 0))
+            stats.size = len(resp.content)
+            return resp
+        finally:
+            current_request.stats = None
+            stats.total = time.perf_counter() - stats.started_at
+            for hook in self.hooks:
+                hook(stats)
+
+    def _send_with_retries(self, send: Callable[..., requests.Response], path: str,
+                           session_id: str | None, idempotent: bool, stats: RequestStats | None,
+                           **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        url = self.base_url + path
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            retry_after = None
+            try:
+                resp = send(url, headers=session_headers(session_id), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if attempt >= self.retries or not (idempotent or is_connect_error(exc)):
+                    raise
+            else:
+                if resp.status_code not in RETRY_STATUS_CODES or not idempotent or attempt >= self.retries:
+                    return resp
+                retry_after = resp.headers.get('Retry-After')
+            time.sleep(backoff_delay(attempt, self.backoff, self.backoff_max, retry_after))
+            attempt += 1
+            if stats is not None:
+                stats.retries = attempt
+                stats.dns = stats.connect = stats.tls = None
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> 'NalogClient':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+rate_limiter = (TokenBucket(settings.NALOG_RATE_LIMIT, settings.NALOG_RATE_BURST)
+                if settings.NALOG_RATE_LIMIT > 0 else None)
+
+client = NalogClient(base_url=settings.NALOG_API_URL,
+                     pool_size=settings.NALOG_POOL_SIZE,
+                     timeout=settings.NALOG_TIMEOUT,
+                     keep_alive=settings.NALOG_KEEP_ALIVE,
+                     rate_limiter=rate_limiter,
+                     retries=settings.NALOG_RETRIES,
+                     backoff=settings.NALOG_BACKOFF,
+                     backoff_max=settings.NALOG_BACKOFF_MAX,
+                     hooks=[record_request] if settings.NALOG_METRICS else [])
+
+
 def register(func: Callable) -> Callable:
     auth_methods[func.__name__] = func
     return func
@@ -60,7 +205,7 @@ def inn(inn: str, password: str, client_secret: str) -> SessionTokens:
         'password': password
     }
 
-    resp = requests.post(INN_AUTH_URL, json=payload, headers=headers)
+    resp = client.post(INN_AUTH_PATH, json=payload, idempotent=False)
 
     if resp.status_code != 200:
         raise NalogAuthError(resp)
@@ -78,13 +223,13 @@ def sms(phone: str, input_interface: Callable[[str], str], client_secret: str) -
         'os': OS
     }
 
-    resp = requests.post(SMS_AUTH_URL, json=payload, headers=headers)
+    resp = client.post(SMS_AUTH_PATH, json=payload, idempotent=False)
 
     if resp.status_code != 204:
         raise NalogAuthError(resp)
 
     payload['code'] = input_interface("СМС код:")
-    resp = requests.post(SMS_VERIFY_AUTH_URL, json=payload, headers=headers)
+    resp = client.post(SMS_VERIFY_AUTH_PATH, json=payload, idempotent=False)
 
     if resp.status_code != 200:
         raise NalogAuthError(resp)
@@ -103,25 +248,46 @@ def authorization(method: str, *args, **kwargs) -> SessionTokens | None:
 
 
 @validate_call
-def refresh_session(*, session_id: str,
-                    refresh_token: str,
-                    client_secret: str) -> SessionTokens | None:
+def request_refresh_session(*, session_id: str,
+                            refresh_token: str,
+                            client_secret: str) -> SessionTokens:
+    """
+    Refresh the session
+    :raise NalogAuthError: the tokens are rejected by the service
+    :raise NalogAPIError, requests.RequestException: the service or network failed, the tokens may be still valid
+    """
     payload = {
         'refresh_token': refresh_token,
         'client_secret': client_secret
     }
-    headers['sessionId'] = session_id
 
+    resp = client.post(REFRESH_AUTHORIZATION_PATH, json=payload, session_id=session_id, idempotent=False)
+    if resp.status_code in RETRY_STATUS_CODES:
+        raise NalogAPIError(resp)
+    if resp.status_code != 200:
+        raise NalogAuthError(resp)
+    return SessionTokens(session_id=resp.json()['sessionId'],
+                         refresh_token=resp.json()['refresh_token'])
+
+
+@validate_call
+def refresh_session(*, session_id: str,
+                    refresh_token: str,
+                    client_secret: str) -> SessionTokens | None:
     try:
-        resp = requests.post(REFRESH_AUTHORIZATION_URL, json=payload, headers=headers)
-        if resp.status_code != 200:
-            raise NalogAuthError(resp)
-        return SessionTokens(session_id=resp.json()['sessionId'],
-                             refresh_token=resp.json()['refresh_token'])
+        return request_refresh_session(session_id=session_id, refresh_token=refresh_token,
+                                       client_secret=client_secret)
     except Exception:
         logger.exception("")
 
 
+def check_ticket_response(resp: requests.Response | httpx.Response, qr: str) -> None:
+    if resp.status_code in AUTH_ERROR_CODES:
+        raise NalogAuthError(resp, qr=qr)
+    if resp.status_code != 200:
+        raise NalogAPIError(resp, qr=qr)
+
+
 def _get_ticket_id(qr: str, session_id: str) -> str:
     """
     Get ticket id by info from qr code
@@ -129,27 +295,44 @@ def _get_ticket_id(qr: str, session_id: str) -> str:
     :return: ticket id. Example "5f3bc6b953d5cb4f4e43a06c"
     """
     payload = {'qr': qr}
-    headers['sessionId'] = session_id
 
-    resp = requests.post(TICKET_ID_URL, json=payload, headers=headers)
-
-    if resp.status_code != 200:
-        raise NalogAPIError(resp, qr=qr)
+    resp = client.post(TICKET_ID_PATH, json=payload, session_id=session_id)
+    check_ticket_response(resp, qr)
 
     return resp.json()['id']
 
 
 @validate_call
-def get_ticket_api(qr: str, session_id: str) -> str | None:
+def get_ticket_id_api(qr: str, session_id: str) -> str | None:
+    """
+    Get ticket id by info from qr code
+    :raise NalogAuthError: session is expired or invalid, other errors are logged
+    """
     try:
-        ticket_id = _get_ticket_id(qr, session_id)
-        url = TICKET_DETAILS_URL % ticket_id
+        return _get_ticket_id(qr, session_id)
+    except NalogAuthError:
+        raise
+    except Exception:
+        logger.exception("")
 
-        resp = requests.get(url, headers=headers)
 
-        if resp.status_code != 200:
-            raise NalogAPIError(resp, qr=qr)
+@validate_call
+def get_ticket_api(qr: str, session_id: str, ticket_id: str | None = None) -> str | None:
+    """
+    Get ticket json by info from qr code
+    :param ticket_id: already known ticket id, the request of ticket id is skipped
+    :raise NalogAuthError: session is expired or invalid, other errors are logged
+    """
+    try:
+        if ticket_id is None:
+            ticket_id = _get_ticket_id(qr, session_id)
+        path = TICKET_DETAILS_PATH % ticket_id
+
+        resp = client.get(path, session_id=session_id)
+        check_ticket_response(resp, qr)
 
         return resp.text
+    except NalogAuthError:
+        raise
     except Exception:
         logger.exception("")
@@ -0,0 +1,86 @@
+"""
+Persistent cache of QR codes decoded from images, keyed by the content hash of the file.
+Re-selected photos, re-scanned folders and images moved to saved/failed are not decoded again,
+undecodable images are skipped too. Size and mtime of the path are checked before hashing the content.
+Results are cached for settings.TICKET_QR_FILTER, the only filter used for images.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from .metrics import registry
+from .qr_code import DecodeResult, QRCReader, record_decode
+from ..settings import settings
+from ..storage.repository import QRImageStorage
+
+registry.counter('qr_decode_cache_total', "Lookups of decoded images in the cache by result")
+
+reader = QRCReader()
+
+
+@dataclass
+class CacheEntry:
+    """
+    Image looked up in the cache, result is None if the image was not decoded yet
+    """
+    path: Path
+    sha256: str
+    result: DecodeResult | None
+
+    def store(self, result: DecodeResult) -> None:
+        stat = self.path.stat()
+        QRImageStorage.save({'sha256': self.sha256,
+                             'path': str(self.path),
+                             'size': stat.st_size,
+                             'mtime': stat.st_mtime,
+                             'qrcodes': '\n'.join(result.qrcodes),
+                             'stage': result.stage})
+
+
+def file_sha256(path: Path) -> str:
+    with open(path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+
+def lookup(filename: str | Path) -> CacheEntry:
+    """
+    Find decoded image by path, size and mtime, then by the content hash
+    """
+    path = Path(filename).resolve()
+    stat = path.stat()
+    row = QRImageStorage.find(path=str(path), size=stat.st_size, mtime=stat.st_mtime)
+    if row is None:
+        sha256 = file_sha256(path)
+        row = QRImageStorage.find(sha256=sha256)
+        if row is not None:
+            # the same content under the other path, e.g. moved to saved/failed
+            QRImageStorage.update(sha256, {'path': str(path), 'size': stat.st_size, 'mtime': stat.st_mtime})
+    else:
+        sha256 = row.sha256
+    registry.inc('qr_decode_cache_total', (('result', 'miss' if row is None else 'hit'),))
+    if row is None:
+        return CacheEntry(path, sha256, None)
+    return CacheEntry(path, sha256, DecodeResult(row.qrcodes.split('\n') if row.qrcodes else [], row.stage))
+
+
+def decode_file(filename: str | Path) -> DecodeResult:
+    """
+    Decode ticket QR codes of the image, by the cache if QR_DECODE_CACHE is set
+    """
+    if not os.path.isfile(filename):
+        raise FileNotFoundError(f"No such file or directory: {filename!r}")
+    if not settings.QR_DECODE_CACHE:
+        return decode_image(filename)
+    entry = lookup(filename)
+    if entry.result is not None:
+        return entry.result
+    result = decode_image(filename)
+    entry.store(result)
+    return result
+
+
+def decode_image(filename: str | Path) -> DecodeResult:
+    result = reader.decode(filename)
+    record_decode(result)
+    return result
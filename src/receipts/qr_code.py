@@ -1,29 +1,262 @@
 # https://vc.ru/newtechaudit/301060-computer-vision-v-pomoshch-dekodirovaniya-qr-koda-na-python
 import os.path
 import re
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
 
 import cv2
+import numpy as np
 from pyzbar import pyzbar
 
+from .metrics import registry
+from ..settings import settings
+
+MAX_SIDE = 2000  # px, larger photos are downscaled
+ROTATION_ANGLES = (15, -15, 45)
+# reduced decoding: the QR region is found in the image loaded with 1/REDUCTION of sides
+REDUCTION = 4
+REDUCED_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4}
+REGION_MIN_SIDE = 12  # px of the reduced image
+REGION_MIN_FILL = 0.6  # part of the bounding box covered by the region
+REGION_MARGIN = 0.25  # of the region side, for the quiet zone and a wrong bound
+ROI_MIN_SIDE = 600  # px of the decoded region, it is loaded with a lower reduction if it's smaller
+MAX_REGIONS = 3  # the densest regions decoded before the whole image
+
+Source = str | Path | bytes | np.ndarray
+# sentinel of the default pattern of QRCReader, None means all QR codes
+DEFAULT_PATTERN: Any = object()
+
+registry.counter('qr_decode_attempts_total', "Images passed to a stage of QR decoding")
+registry.counter('qr_decoded_total', "Images by the stage which decoded QR codes, 'failed' if none")
+registry.histogram('qr_decode_stage_seconds', "Time of preprocessing and decoding by a stage")
+
+
+def stage_gray(image: np.ndarray) -> Iterator[np.ndarray]:
+    yield image
+
+
+def stage_downscale(image: np.ndarray) -> Iterator[np.ndarray]:
+    scale = MAX_SIDE / max(image.shape[:2])
+    if scale < 1:
+        yield cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def stage_threshold(image: np.ndarray) -> Iterator[np.ndarray]:
+    yield cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+
+
+def stage_sharpen(image: np.ndarray) -> Iterator[np.ndarray]:
+    blurred = cv2.GaussianBlur(image, (0, 0), 3)
+    yield cv2.addWeighted(image, 1.5, blurred, -0.5, 0)
+
+
+def stage_rotate(image: np.ndarray) -> Iterator[np.ndarray]:
+    height, width = image.shape[:2]
+    for angle in ROTATION_ANGLES:
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1)
+        yield cv2.warpAffine(image, matrix, (width, height), borderValue=(255,))
+
+
+class Stage(NamedTuple):
+    name: str
+    images: Callable[[np.ndarray], Iterator[np.ndarray]]
+    rebase: bool = False  # the next stages get the image of this stage
+
+
+# cheap stages first, a stage without images (e.g. downscale of a small photo) is skipped
+STAGES = (
+    Stage('gray', stage_gray),
+    Stage('downscale', stage_downscale, rebase=True),
+    Stage('threshold', stage_threshold),
+    Stage('sharpen', stage_sharpen),
+    Stage('rotate', stage_rotate),
+)
+# stages of regions, the expensive ones are left for the whole image
+ROI_STAGES = tuple(stage for stage in STAGES if stage.name in ('gray', 'threshold'))
+
+
+@dataclass
+class DecodeResult:
+    qrcodes: list[str] = field(default_factory=list)
+    stage: str | None = None
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+def decode_qr(image: np.ndarray, pattern: re.Pattern | None = None) -> list[str]:
+    qrcodes = [data.data.decode('utf-8') for data in pyzbar.decode(image) if data.type == 'QRCODE']
+    if pattern is not None:
+        return [qr for qr in qrcodes if pattern.fullmatch(qr)]
+    return qrcodes
+
+
+def decode_staged(image: np.ndarray, pattern: re.Pattern | None = None,
+                  stages: Iterable[Stage] = STAGES) -> DecodeResult:
+    """
+    Decode QR codes of the grayscale image, escalating by stages until a QR code is found
+    :param pattern: only matched QR codes are taken as success
+    """
+    result = DecodeResult()
+    for stage in stages:
+        started_at = time.perf_counter()
+        attempted = False
+        for candidate in stage.images(image):
+            attempted = True
+            if stage.rebase:
+                image = candidate
+            if qrcodes := decode_qr(candidate, pattern):
+                result.timings[stage.name] = time.perf_counter() - started_at
+                result.qrcodes, result.stage = qrcodes, stage.name
+                return result
+        if attempted:
+            result.timings[stage.name] = time.perf_counter() - started_at
+    return result
+
+
+def find_qr_regions(image: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """
+    Find square regions of dense dark modules, cheap enough for the reduced image
+    :return: bounding boxes (x, y, width, height), the densest first
+    """
+    binary = cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 15, 10)
+    closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    regions = []
+    for contour in contours:
+        x, y, width, height = cv2.boundingRect(contour)
+        if min(width, height) < REGION_MIN_SIDE or not 0.7 <= width / height <= 1.4:
+            continue
+        fill = cv2.contourArea(contour) / (width * height)
+        if fill >= REGION_MIN_FILL:
+            regions.append((fill, (x, y, width, height)))
+    return [region for fill, region in sorted(regions, reverse=True)]
+
+
+def load_image(source: Source, scale: int = 1) -> np.ndarray:
+    """
+    Load grayscale image with sides reduced by scale (1, 2 or 4), JPEG is decoded reduced
+    :param source: path of the file, encoded image (bytes) or decoded image (numpy array)
+    """
+    if isinstance(source, np.ndarray):
+        image = source if source.ndim == 2 else cv2.cvtColor(source, cv2.COLOR_BGR2GRAY)
+        if scale == 1:
+            return image
+        return cv2.resize(image, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+    if isinstance(source, bytes):
+        decoded = cv2.imdecode(np.frombuffer(source, np.uint8), REDUCED_FLAGS[scale])
+        if decoded is None:
+            raise ValueError("Unsupported image in memory")
+        return decoded
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"No such file or directory: {str(source)!r}")
+    decoded = cv2.imread(str(source), REDUCED_FLAGS[scale])
+    if decoded is None:
+        raise ValueError(f"Unsupported image: {str(source)!r}")
+    return decoded
+
+
+def decode_reduced(source: Source, pattern: re.Pattern | None = None) -> DecodeResult:
+    """
+    Decode QR codes by regions found in the reduced image, MAX_REGIONS of the densest regions
+    are decoded by the cheap ROI_STAGES. The image is loaded again with the lowest reduction
+    that keeps ROI_MIN_SIDE of the regions, the full resolution for usual receipts.
+    The whole image is decoded by all stages if no region has QR codes
+    """
+    started_at = time.perf_counter()
+    reduced = load_image(source, REDUCTION)
+    regions = find_qr_regions(reduced)[:MAX_REGIONS]
+    timings = {'detect': time.perf_counter() - started_at}
+    image, scale = reduced, REDUCTION
+    if regions:
+        side = max(max(width, height) for x, y, width, height in regions)
+        scale = next(scale for scale in sorted(REDUCED_FLAGS, reverse=True)
+                     if scale == 1 or side * REDUCTION / scale >= ROI_MIN_SIDE)
+        image = reduced if scale == REDUCTION else load_image(source, scale)
+        factor = REDUCTION / scale
+        for x, y, width, height in regions:
+            margin = REGION_MARGIN * max(width, height)
+            top, left = int(max(y - margin, 0) * factor), int(max(x - margin, 0) * factor)
+            bottom, right = int((y + height + margin) * factor), int((x + width + margin) * factor)
+            result = decode_staged(image[top:bottom, left:right], pattern, ROI_STAGES)
+            for name, seconds in result.timings.items():
+                timings[f'roi_{name}'] = timings.get(f'roi_{name}', 0) + seconds
+            if result.qrcodes:
+                return DecodeResult(result.qrcodes, f'roi_{result.stage}', timings)
+    if scale != 1:
+        image = load_image(source)
+    result = decode_staged(image, pattern)
+    result.timings = timings | result.timings
+    return result
+
+
+def record_decode(result: DecodeResult) -> None:
+    """Collect timings of stages and the successful stage in the metrics registry"""
+    for name, seconds in result.timings.items():
+        registry.inc('qr_decode_attempts_total', (('stage', name),))
+        registry.observe('qr_decode_stage_seconds', seconds, (('stage', name),))
+    registry.inc('qr_decoded_total', (('stage', result.stage or 'failed'),))
+
 
 class QRCReader:
-    def __init__(self, filename: str):
-        if not os.path.exists(filename):
-            raise FileNotFoundError(f"No such file or directory: {filename!r}")
-        self.filename = filename
-        self.qrcodes: list[str] = []
-
-    def read(self):
-        img = cv2.imread(self.filename)
-        all_data = pyzbar.decode(img)
-        for data in all_data:
-            if data.type == 'QRCODE':
-                self.qrcodes.append(data.data.decode('utf-8'))
-
-    def all(self):
-        return self.read()
-
-    def filter(self, re_str: str) -> list[str]:
-        self.read()
-        re_filter = re.compile(re_str)
-        return [qr for qr in self.qrcodes if re_filter.fullmatch(qr)]
+    """
+    Reusable decoder of QR codes, one instance can decode any number of images,
+    e.g. kept alive by a watcher of the images directory
+    :param pattern: only matched QR codes are taken, settings.TICKET_QR_FILTER by default, None - all
+    :param reduced: decode by regions found in the reduced image (decode_reduced),
+     QR_REDUCED_DECODE setting by default
+    """
+
+    def __init__(self, pattern: str | None = DEFAULT_PATTERN, reduced: bool | None = None):
+        if pattern is DEFAULT_PATTERN:
+            pattern = settings.TICKET_QR_FILTER
+        self.pattern = None if pattern is None else re.compile(pattern)
+        self.reduced = settings.QR_REDUCED_DECODE if reduced is None else reduced
+
+    def decode(self, source: Source, pattern: re.Pattern | None = DEFAULT_PATTERN) -> DecodeResult:
+        """
+        Decode QR codes of the image without metrics, for workers of a process pool
+        :param source: path of the file, encoded image (bytes) or decoded image (numpy array)
+        :param pattern: pattern of the reader by default, None - all QR codes
+        """
+        if pattern is DEFAULT_PATTERN:
+            pattern = self.pattern
+        if self.reduced:
+            return decode_reduced(source, pattern)
+        return decode_staged(load_image(source), pattern)
+
+    def read(self, source: Source, pattern: re.Pattern | None = DEFAULT_PATTERN) -> list[str]:
+        result = self.decode(source, pattern)
+        record_decode(result)
+        return result.qrcodes
+
+    def all(self, source: Source) -> list[str]:
+        """All QR codes of the image, without the pattern"""
+        return self.read(source, None)
+
+    def filter(self, source: Source) -> list[str]:
+        """QR codes of the image matched by the pattern"""
+        return self.read(source)
+
+    def iter(self, sources: Iterable[Source]) -> Iterator[tuple[Source, str]]:
+        """
+        Decode images lazily, the next image is decoded when QR codes of the previous one are taken
+        :return: pairs (source, qr) of images with QR codes matched by the pattern
+        """
+        for source in sources:
+            for qr in self.read(source):
+                yield source, qr
+
+
+@lru_cache
+def get_reader(pattern: str | None) -> QRCReader:
+    return QRCReader(pattern)
+
+
+def read_qr_codes(filename: str, re_str: str) -> DecodeResult:
+    """
+    Decode QR codes of the image matched by re_str, for workers of a process pool.
+    Every worker keeps a reader for the pattern, metrics are not collected in workers, the caller records the result
+    """
+    return get_reader(re_str).decode(filename)
@@ -0,0 +1,58 @@
+import asyncio
+import random
+import threading
+import time
+
+# status codes of responses which are worth to repeat later
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, shared by synchronous and asynchronous callers
+    :param rate: tokens added per second
+    :param capacity: max number of tokens, allowed burst of requests
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token in advance
+        :return: delay (seconds) before the token may be used
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, 0.0)
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def backoff_delay(attempt: int, backoff: float, backoff_max: float,
+                  retry_after: str | None = None) -> float:
+    """
+    Delay before the next attempt: exponential backoff with full jitter
+    :param attempt: number of the failed attempt, starting from 0
+    :param retry_after: value of 'Retry-After' header, it has priority if it is seconds
+    """
+    if retry_after is not None and retry_after.isdigit():
+        return min(float(retry_after), backoff_max)
+    return random.uniform(0, min(backoff_max, backoff * 2 ** attempt))
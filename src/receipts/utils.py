@@ -1,10 +1,23 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Iterable, Iterator
 
-from .nalog_api import get_ticket_api, refresh_session
-from .qr_code import QRCReader
+from .exceptions import NalogAuthError, TicketNotReceivedError
+from .nalog_api import get_ticket_api, get_ticket_id_api, request_refresh_session
+from .qr_cache import CacheEntry, decode_file, lookup
+from .qr_code import DecodeResult, read_qr_codes, record_decode
 from ..settings import settings, NalogSession
-from ..storage.repository import NalogSessionStorage, QRCodeStorage
+from ..storage.models import QRCodeORM, TicketIdORM
+from ..storage.repository import NalogSessionStorage, QRCodeStorage, TicketIdStorage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
 
 
 def nalog_auth(auth_dialog: Callable, *args) -> bool:
@@ -12,6 +25,7 @@ def nalog_auth(auth_dialog: Callable, *args) -> bool:
         tokens = NalogSessionStorage.list()
         if len(tokens) == 1:
             settings.auth_nalog = NalogSession.model_validate(tokens[0])
+            session_refresher.start()
 
     if settings.auth_nalog is not None:
         return True
@@ -21,21 +35,99 @@ def nalog_auth(auth_dialog: Callable, *args) -> bool:
     if tokens is not None:
         settings.auth_nalog = NalogSession.model_validate(tokens)
         NalogSessionStorage.add(settings.auth_nalog.model_dump())
+        session_refresher.start()
         return True
 
     return False
 
 
-def update_nalog_session() -> None:
-    if settings.auth_nalog is None:
-        raise RuntimeError("Need authorization and set settings.auth_nalog")
-    tokens = settings.auth_nalog
-    settings.auth_nalog = None
-    NalogSessionStorage.delete_all()
-    new_tokens = refresh_session(session_id=tokens.session_id,
-                                 refresh_token=tokens.refresh_token,
-                                 client_secret=settings.CLIENT_SECRET)
-    if new_tokens is not None:
+class SessionRefresher:
+    """
+    Keeps the nalog session from settings.auth_nalog fresh.
+    The session is refreshed in background before it expires, and
+    concurrent callers of refresh wait for a single request to the service.
+    The old session is kept until the new one is received, it is dropped only if the service rejects it,
+    after failures of network or service the refresh is repeated by the timer in retry_delay,
+    callers don't request it again until then.
+    :param lifetime: lifetime (seconds) of the session
+    :param refresh_ahead: how long (seconds) before expiry the session is refreshed
+    :param retry_delay: delay (seconds) of the next refresh after a failure of network or service
+    """
+
+    def __init__(self, lifetime: float, refresh_ahead: float, retry_delay: float = 30.0):
+        self.lifetime = lifetime
+        self.refresh_ahead = refresh_ahead
+        self.retry_delay = retry_delay
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._idle = threading.Event()  # cleared while a refresh request is in flight
+        self._idle.set()
+        self._timer: threading.Timer | None = None
+        self._retry_at = 0.0  # monotonic time of the refresh after a failure
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() - self.updated_at >= self.lifetime - self.refresh_ahead
+
+    @property
+    def backing_off(self) -> bool:
+        """The last refresh failed, the next one is left to the timer"""
+        return time.monotonic() < self._retry_at
+
+    def start(self) -> None:
+        """Start tracking the age of the current session"""
+        self.updated_at = time.monotonic()
+        self._schedule()
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def refresh(self, session_id: str | None = None) -> None:
+        """
+        Refresh the session
+        :param session_id: session known as expired by the caller, if it was already
+         replaced by a concurrent refresh or the last refresh failed in retry_delay, nothing is requested
+        """
+        self._refresh_locked(session_id, backoff=session_id is not None)
+
+    def _refresh_locked(self, session_id: str | None, backoff: bool) -> None:
+        with self._lock:
+            tokens = settings.auth_nalog
+            if tokens is None:
+                raise RuntimeError("Need authorization and set settings.auth_nalog")
+            if session_id is not None and session_id != tokens.session_id:
+                return
+            if backoff and self.backing_off:
+                return
+
+            self.stop()
+            self._idle.clear()
+            try:
+                self._refresh(tokens)
+            finally:
+                self._idle.set()
+
+    def _refresh(self, tokens: NalogSession) -> None:
+        try:
+            new_tokens = request_refresh_session(session_id=tokens.session_id,
+                                                 refresh_token=tokens.refresh_token,
+                                                 client_secret=settings.CLIENT_SECRET)
+        except NalogAuthError:
+            logger.exception("Nalog session is rejected, authorization is required")
+            settings.auth_nalog = None
+            NalogSessionStorage.delete_all()
+            return
+        except Exception:
+            logger.exception("Nalog session is not refreshed, retry in %s s", self.retry_delay)
+            self._retry_at = time.monotonic() + self.retry_delay
+            self._schedule(self.retry_delay)
+            return
+
+        self._retry_at = 0.0
+
+        NalogSessionStorage.delete_all()
         NalogSessionStorage.add(
             {
                 'session_id': new_tokens.session_id,
@@ -43,21 +135,112 @@ def update_nalog_session() -> None:
             }
         )
         settings.auth_nalog = NalogSession.model_validate(new_tokens)
+        self.start()
+
+    def wait(self) -> None:
+        """Wait for the refresh in flight, if any"""
+        self._idle.wait()
+
+    def ensure_fresh(self) -> None:
+        self.wait()
+        if settings.auth_nalog is not None and self.expired and not self.backing_off:
+            self.refresh(settings.auth_nalog.session_id)
+
+    def _schedule(self, delay: float | None = None) -> None:
+        self.stop()
+        if settings.auth_nalog is None:
+            return
+        if delay is None:
+            delay = max(self.lifetime - self.refresh_ahead, 0)
+        self._timer = threading.Timer(delay, self._refresh_in_background, args=(settings.auth_nalog.session_id,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh_in_background(self, session_id: str) -> None:
+        if settings.auth_nalog is not None:
+            self._refresh_locked(session_id, backoff=False)
+
+
+session_refresher = SessionRefresher(lifetime=settings.NALOG_SESSION_LIFETIME,
+                                     refresh_ahead=settings.NALOG_SESSION_REFRESH_AHEAD)
+
+
+def update_nalog_session() -> None:
+    session_refresher.refresh()
+
+
+def _request_ticket(qr: str, session_id: str) -> str | None:
+    ticket_id = TicketIdStorage.value(qr, TicketIdORM.ticket_id)
+    if ticket_id is None:
+        ticket_id = get_ticket_id_api(qr, session_id)
+        if ticket_id is None:
+            return None
+        TicketIdStorage.add({'qr': qr, 'ticket_id': ticket_id})
+    ticket_json = get_ticket_api(qr, session_id, ticket_id)
+    if ticket_json is None:
+        # the cached id may be stale, it is requested again next time
+        TicketIdStorage.delete(qr)
+    return ticket_json
 
 
 def get_ticket(qr: str) -> str | None:
     if settings.auth_nalog is None:
         raise RuntimeError("Need authorization and set settings.auth_nalog")
-    ticket_json = get_ticket_api(qr, settings.auth_nalog.session_id)
-    if ticket_json is None:
-        update_nalog_session()
-        ticket_json = get_ticket_api(qr, settings.auth_nalog.session_id)
+    ticket_json = QRCodeStorage.value(qr, QRCodeORM.json_)
+    if ticket_json is not None:
+        return ticket_json
 
-    return ticket_json
+    session_refresher.ensure_fresh()
+    if settings.auth_nalog is None:
+        return None
+
+    session_id = settings.auth_nalog.session_id
+    try:
+        return _request_ticket(qr, session_id)
+    except NalogAuthError:
+        session_refresher.refresh(session_id)
+
+    if settings.auth_nalog is None:
+        return None
+    try:
+        return _request_ticket(qr, settings.auth_nalog.session_id)
+    except NalogAuthError:
+        return None
+
+
+def get_tickets(qrs: Iterable[str],
+                max_workers: int | None = None) -> Iterator[tuple[str, str | Exception]]:
+    """
+    Get tickets for many qr codes concurrently
+    :param qrs: texts from qr codes
+    :param max_workers: number of concurrent requests, limited by settings.NALOG_POOL_SIZE
+    :return: pairs (qr, ticket json or exception) in order of completion
+    """
+    if settings.auth_nalog is None:
+        raise RuntimeError("Need authorization and set settings.auth_nalog")
+    if max_workers is None or max_workers > settings.NALOG_POOL_SIZE:
+        max_workers = settings.NALOG_POOL_SIZE
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(get_ticket, qr): qr for qr in qrs}
+        for future in as_completed(futures):
+            qr = futures[future]
+            try:
+                ticket_json = future.result()
+            except Exception as exc:
+                yield qr, exc
+                continue
+            if ticket_json is None:
+                yield qr, TicketNotReceivedError(qr)
+            else:
+                yield qr, ticket_json
+    finally:
+        executor.shutdown(cancel_futures=True)
 
 
 def get_qr_code(filename: str) -> str | None:
-    qrs = QRCReader(filename).filter(settings.TICKET_QR_FILTER)
+    qrs = decode_file(filename).qrcodes
     if not qrs:
         return None
 
@@ -67,6 +250,65 @@ def get_qr_code(filename: str) -> str | None:
     return qrs[0]
 
 
+@dataclass
+class ScanResult:
+    qrcodes: dict[Path, list[str]] = field(default_factory=dict)
+    failed: list[Path] = field(default_factory=list)
+    added: set[str] = field(default_factory=set)
+
+
+def scan_qr_images(directory: str | Path | None = None, *, max_workers: int | None = None) -> ScanResult:
+    """
+    Decode QR codes of all images in the directory by a process pool and add them by one insert.
+    Images are moved to 'saved' or 'failed' subdirectories like in QRCodeFrame.get_from_img
+    :param directory: settings.QR_IMAGES_DIR by default, subdirectories are not scanned
+    :param max_workers: number of processes, all cores by default
+    """
+    if directory is None:
+        directory = settings.QR_IMAGES_DIR
+    if directory is None:
+        raise ValueError("Directory of QR images is not set")
+    files = sorted(path for path in Path(directory).iterdir() if path.is_file() and path.suffix.lower() in IMAGE_SUFFIXES)
+    result = ScanResult()
+    if not files:
+        return result
+
+    # images found in the cache are not decoded again, see receipts.qr_cache
+    entries: dict[Path, CacheEntry | None] = {path: lookup(path) if settings.QR_DECODE_CACHE else None
+                                              for path in files}
+    decoded: dict[Path, DecodeResult] = {path: entry.result for path, entry in entries.items()
+                                         if entry is not None and entry.result is not None}
+    missing = [path for path in files if path not in decoded]
+    if missing:
+        max_workers = min(max_workers or os.cpu_count() or 1, len(missing))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(read_qr_codes, str(path), settings.TICKET_QR_FILTER) for path in missing]
+            for path, future in zip(missing, futures):
+                try:
+                    decode_result = future.result()
+                except Exception as exc:
+                    logger.warning("QR code of %s is not decoded: %r", path, exc)
+                    decoded[path] = DecodeResult()  # unreadable images are not cached
+                    continue
+                record_decode(decode_result)
+                if (entry := entries[path]) is not None:
+                    entry.store(decode_result)
+                decoded[path] = decode_result
+
+    for path in files:
+        if decoded[path].qrcodes:
+            result.qrcodes[path] = decoded[path].qrcodes
+        else:
+            result.failed.append(path)
+
+    result.added = QRCodeStorage.add_new(qr for qrs in result.qrcodes.values() for qr in qrs)
+    for path in result.qrcodes:
+        replace_file(path, 'saved')
+    for path in result.failed:
+        replace_file(path, 'failed')
+    return result
+
+
 def replace_file(filename: str | Path, new_path: str | Path) -> None:
     filepath = Path(filename)
     filename = filepath.name
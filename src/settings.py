@@ -19,6 +19,14 @@ class DBSettings(BaseSettings):
                                       env_prefix='db_',
                                       extra='ignore', )
     NAME: str
+    # connection profile of SQLite, see https://www.sqlite.org/pragma.html
+    JOURNAL_MODE: str = 'WAL'
+    SYNCHRONOUS: str = 'NORMAL'
+    MMAP_SIZE: int = 256 * 1024 * 1024  # bytes
+    CACHE_SIZE: int = -64 * 1024  # pages, negative - KiB
+    TEMP_STORE: str = 'MEMORY'
+    BUSY_TIMEOUT: int = 5000  # milliseconds
+    CACHED_STATEMENTS: int = 256  # prepared statements cached by every connection
 
     @property
     def URL(self):
@@ -26,6 +34,18 @@ class DBSettings(BaseSettings):
             return f"sqlite:///{BASE_DIR / self.NAME}"
         return "sqlite://"  # To use a SQLite :memory: database
 
+    @property
+    def PRAGMAS(self) -> dict[str, str | int]:
+        return {
+            'foreign_keys': 'true',
+            'journal_mode': self.JOURNAL_MODE,
+            'synchronous': self.SYNCHRONOUS,
+            'mmap_size': self.MMAP_SIZE,
+            'cache_size': self.CACHE_SIZE,
+            'temp_store': self.TEMP_STORE,
+            'busy_timeout': self.BUSY_TIMEOUT,
+        }
+
 
 class NalogAPISettings(BaseSettings):
     model_config = SettingsConfigDict(env_file=BASE_DIR / '.env',
@@ -37,6 +57,18 @@ class NalogAPISettings(BaseSettings):
     INN: Annotated[str, BeforeValidator(inn_validate)] | None = None
     PASSWORD: SecretStr | None = Field(None, alias='nalog_password')
     USE_NALOG_AUTHORIZATION: str = 'inn'
+    NALOG_API_URL: str = 'https://irkkt-mobile.nalog.ru:8888'
+    NALOG_POOL_SIZE: int = 10
+    NALOG_TIMEOUT: float = 10.0
+    NALOG_KEEP_ALIVE: bool = True
+    NALOG_SESSION_LIFETIME: float = 3600.0
+    NALOG_SESSION_REFRESH_AHEAD: float = 300.0
+    NALOG_RATE_LIMIT: float = 5.0  # requests per second, 0 - without limit
+    NALOG_RATE_BURST: int = 10
+    NALOG_RETRIES: int = 3
+    NALOG_BACKOFF: float = 0.5
+    NALOG_BACKOFF_MAX: float = 30.0
+    NALOG_METRICS: bool = False
 
     @staticmethod
     def inn_validate(inn: str) -> str:
@@ -64,6 +96,10 @@ class Settings(GUISettings,
     MODE: str
     DEBUG: bool = False
     TICKET_QR_FILTER: str = r"t=[0-9]{8}T[0-9]+&s=[0-9]+.[0-9]{2}&fn=[0-9]{16}&i=[0-9]+&fp=[0-9]+&n=[0-9]"
+    FAST_TICKET_PARSER: bool = False
+    QR_REDUCED_DECODE: bool = False
+    QR_DECODE_CACHE: bool = True
+    PRODUCT_CACHE_SIZE: int = 10000
     db: DBSettings = DBSettings()
     auth_nalog: NalogSession | None = None
 
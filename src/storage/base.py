@@ -1,25 +1,37 @@
-from typing import Type
-
-from pydantic import BaseModel
-from sqlalchemy import create_engine, event, Engine
+from typing import Any, Iterable, NamedTuple, Protocol, Type
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import MappedAsDataclass, Session
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
-from sqlalchemy.orm.collections import InstrumentedList
 from sqlalchemy.orm.relationships import RelationshipProperty
 
 from ..settings import settings
 
-engine = create_engine(settings.db.URL, echo=settings.DEBUG)
+engine = create_engine(settings.db.URL, echo=settings.DEBUG,
+                       connect_args={'cached_statements': settings.db.CACHED_STATEMENTS})
 session_factory = sessionmaker(bind=engine)
 
 
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
+def set_pragmas(dbapi_connection, pragmas: dict[str, str | int]) -> None:
     cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=true")
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
     cursor.close()
 
 
+@event.listens_for(engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    set_pragmas(dbapi_connection, settings.db.PRAGMAS)
+
+
+class DTO(Protocol):
+    """Pydantic model or a record with the same API, e.g. receipts.fast_parse.TicketRecord"""
+
+    @property
+    def model_fields(self) -> Iterable[str]: ...
+
+    def model_dump(self, *, exclude: Any = None) -> dict[str, Any]: ...
+
+
 class Base(MappedAsDataclass, DeclarativeBase, init=False):
 
     def save(self, session: Session | None = None):
@@ -31,28 +43,55 @@ class Base(MappedAsDataclass, DeclarativeBase, init=False):
             session.add(self)
 
     @classmethod
-    def from_pydantic[BaseSubclass](cls: Type[BaseSubclass], dto: BaseModel) -> BaseSubclass:  # type: ignore
-        exclude = set()
-        for field in dto.model_fields:
-            comparator = cls._sa_class_manager[field].comparator
-            if isinstance(comparator, RelationshipProperty.Comparator):
-                exclude.add(field)
-
-        obj = cls(**dto.model_dump(exclude=exclude))
-
-        instrumented_list = [f for f in dto.model_fields
-                             if isinstance(getattr(obj, f), InstrumentedList)]
-
-        for field in exclude:
-            if field not in instrumented_list:
-                comparator = cls._sa_class_manager[field].comparator
-                ref = comparator.entity.class_.from_pydantic(getattr(dto, field))
-                setattr(obj, field, ref)
-
-        for field in instrumented_list:
-            for item in getattr(dto, field):
-                comparator = cls._sa_class_manager[field].comparator
-                ref = comparator.entity.class_.from_pydantic(item)
-                getattr(obj, field).append(ref)
+    def from_pydantic[BaseSubclass](cls: Type[BaseSubclass], dto: DTO) -> BaseSubclass:  # type: ignore
+        plan = conversion_plan(cls, type(dto))
+        obj = cls(**{field: getattr(dto, field) for field in plan.columns})
+
+        # graph of the dto is converted by a stack instead of recursion
+        stack = [(obj, dto, plan)]
+        while stack:
+            parent, parent_dto, plan = stack.pop()
+            for field, target in plan.scalars:
+                child_dto = getattr(parent_dto, field)
+                child_plan = conversion_plan(target, type(child_dto))
+                child = target(**{f: getattr(child_dto, f) for f in child_plan.columns})
+                setattr(parent, field, child)
+                stack.append((child, child_dto, child_plan))
+            for field, target in plan.lists:
+                children = getattr(parent, field)
+                for child_dto in getattr(parent_dto, field):
+                    child_plan = conversion_plan(target, type(child_dto))
+                    child = target(**{f: getattr(child_dto, f) for f in child_plan.columns})
+                    children.append(child)
+                    stack.append((child, child_dto, child_plan))
 
         return obj
+
+
+class ConversionPlan(NamedTuple):
+    columns: tuple[str, ...]
+    scalars: tuple[tuple[str, type[Base]], ...]
+    lists: tuple[tuple[str, type[Base]], ...]
+
+
+_conversion_plans: dict[tuple[type[Base], type], ConversionPlan] = {}
+
+
+def conversion_plan(cls: type[Base], dto_class: type) -> ConversionPlan:
+    """
+    Split fields of the dto class into columns and relationships of the ORM class, the plan is computed once
+    """
+    plan = _conversion_plans.get((cls, dto_class))
+    if plan is None:
+        columns, scalars, lists = [], [], []
+        for field in dto_class.model_fields:  # type: ignore[attr-defined]
+            comparator = cls._sa_class_manager[field].comparator  # type: ignore[attr-defined]
+            if not isinstance(comparator, RelationshipProperty.Comparator):
+                columns.append(field)
+            elif comparator.prop.uselist:
+                lists.append((field, comparator.entity.class_))
+            else:
+                scalars.append((field, comparator.entity.class_))
+        plan = ConversionPlan(tuple(columns), tuple(scalars), tuple(lists))
+        _conversion_plans[cls, dto_class] = plan
+    return plan
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import Engine, event, select
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql.dml import UpdateBase
+
+from .base import session_factory
+from .models import CategoryORM, ProductORM
+from ..settings import settings
+
+
+class ProductRow(NamedTuple):
+    id: int
+    name: str
+    provider_inn: int | None
+    category_id: int | None
+    category_name: str | None
+
+
+class ProductCache:
+    """
+    LRU cache of stored products by name, shared by GUI and bulk import.
+    Names are loaded lazily by one IN query for all misses, absent names are cached too.
+    :param maxsize: max number of cached names
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._rows: OrderedDict[str, ProductRow | None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rows(self, names: Iterable[str]) -> dict[str, ProductRow]:
+        """
+        Get rows of stored products, absent names are skipped
+        """
+        result: dict[str, ProductRow] = {}
+        missing = set()
+        with self._lock:
+            for name in names:
+                if name in self._rows:
+                    self._rows.move_to_end(name)
+                    if (row := self._rows[name]) is not None:
+                        result[name] = row
+                else:
+                    missing.add(name)
+        if missing:
+            loaded = self._load(missing)
+            result |= loaded
+            with self._lock:
+                for name in missing:
+                    self._rows[name] = loaded.get(name)
+                while len(self._rows) > self.maxsize:
+                    self._rows.popitem(last=False)
+        return result
+
+    def ids(self, names: Iterable[str]) -> dict[str, int]:
+        return {name: row.id for name, row in self.rows(names).items()}
+
+    def products(self, names: Iterable[str]) -> dict[str, ProductORM]:
+        """
+        Get stored products as new detached instances with loaded category, every call has own instances
+        """
+        return {name: make_product(row) for name, row in self.rows(names).items()}
+
+    def clear(self, *, absent_only: bool = False) -> None:
+        with self._lock:
+            if absent_only:
+                for name in [name for name, row in self._rows.items() if row is None]:
+                    del self._rows[name]
+            else:
+                self._rows.clear()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @staticmethod
+    def _load(names: set[str]) -> dict[str, ProductRow]:
+        stmt = (select(ProductORM.id, ProductORM.name, ProductORM.provider_inn,
+                       ProductORM.category_id, CategoryORM.name)
+                .outerjoin(CategoryORM, ProductORM.category_id == CategoryORM.id)
+                .where(ProductORM.name.in_(names)))
+        with session_factory() as session:
+            return {row[1]: ProductRow(*row) for row in session.execute(stmt)}
+
+
+def make_product(row: ProductRow) -> ProductORM:
+    product = ProductORM()  # type: ignore[call-arg]
+    product.id, product.name, product.provider_inn, product.category_id = row[:4]
+    if row.category_id is not None:
+        category = CategoryORM()  # type: ignore[call-arg]
+        category.id, category.name = row.category_id, row.category_name  # type: ignore[assignment]
+        make_transient_to_detached(category)
+        set_committed_value(product, 'category', category)
+    make_transient_to_detached(product)
+    return product
+
+
+product_cache = ProductCache(settings.PRODUCT_CACHE_SIZE)
+
+
+@event.listens_for(Engine, "after_execute")
+def invalidate_product_cache(conn, clauseelement, multiparams, params, execution_options, result):
+    if not isinstance(clauseelement, UpdateBase):
+        return
+    table = clauseelement.table.name  # type: ignore[attr-defined]
+    if table == ProductORM.__tablename__ and clauseelement.is_insert:
+        # new products don't change cached ones, only names cached as absent
+        product_cache.clear(absent_only=True)
+    elif table in (ProductORM.__tablename__, CategoryORM.__tablename__):
+        product_cache.clear()
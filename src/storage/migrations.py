@@ -0,0 +1,23 @@
+"""
+Migration of the existing database to the current models: new tables and indexes are created,
+the data is kept. Run: python -m src.storage.migrations
+"""
+from sqlalchemy import Engine
+
+from .base import engine
+from .models import Base
+
+
+def migrate(bind: Engine = engine) -> None:
+    # create_all adds only missing tables, indexes of existing tables are created separately
+    Base.metadata.create_all(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+    # statistics of the new indexes, without them sqlite may prefer the index of category to the index of time
+    with bind.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -38,7 +38,8 @@ class ProductORM(Base):
     name: Mapped[text] = mapped_column(unique=True,
                                        sqlite_on_conflict_primary_key='IGNORE',
                                        sqlite_on_conflict_unique='IGNORE')
-    category_id: Mapped[int | None] = mapped_column(ForeignKey('categories.id', ondelete='SET NULL'), nullable=False)
+    category_id: Mapped[int | None] = mapped_column(ForeignKey('categories.id', ondelete='SET NULL'),
+                                                    nullable=False, index=True)
     provider_inn: Mapped[int | None]
 
     category: Mapped['CategoryORM'] = relationship(back_populates='products', lazy='joined')
@@ -65,11 +66,29 @@ class QRCodeORM(Base):
     ticket: Mapped['TicketORM'] = relationship(back_populates='qr_code', repr=False)
 
 
+class QRImageORM(Base):
+    __tablename__ = 'qr_images'
+
+    sha256: Mapped[strpk]
+    path: Mapped[text] = mapped_column(index=True)
+    size: Mapped[int]
+    mtime: Mapped[float]
+    qrcodes: Mapped[text]  # separated by new lines, empty if the image is undecodable
+    stage: Mapped[str | None]  # stage of decoding which found qr codes
+
+
+class TicketIdORM(Base):
+    __tablename__ = 'ticket_ids'
+
+    qr: Mapped[strpk] = mapped_column(sqlite_on_conflict_primary_key='REPLACE')
+    ticket_id: Mapped[str]
+
+
 class TicketORM(Base):
     __tablename__ = 'tickets'
 
     id: Mapped[strpk]
-    date_time: Mapped[int]
+    date_time: Mapped[int] = mapped_column(index=True)
     total_sum: Mapped[int]
     qr = mapped_column(ForeignKey('qrcodes.qr'), unique=True)
     storage_inn = mapped_column(ForeignKey('storages.inn'))
@@ -85,8 +104,8 @@ class PurchaseORM(Base):
     __tablename__ = 'purchases'
 
     id: Mapped[intpk]
-    ticket_id = mapped_column(ForeignKey('tickets.id', ondelete='CASCADE'))
-    product_id = mapped_column(ForeignKey('products.id', ondelete='CASCADE'))
+    ticket_id = mapped_column(ForeignKey('tickets.id', ondelete='CASCADE'), index=True)
+    product_id = mapped_column(ForeignKey('products.id', ondelete='CASCADE'), index=True)
     price: Mapped[int]
     quantity: Mapped[Decimal]
     sum: Mapped[int]
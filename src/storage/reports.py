@@ -0,0 +1,108 @@
+"""
+Aggregate reports of spending, computed by SQL without loading tickets and purchases.
+Sums are in kopecks as stored, periods are in local time.
+"""
+from typing import Any, Literal, Sequence
+
+from sqlalchemy import ColumnElement, Row, Select, func, select
+
+from .base import session_factory
+from .models import CategoryORM, ProductORM, PurchaseORM, StorageORM, TicketORM
+
+Period = Literal['day', 'week', 'month', 'year']
+
+PERIOD_FORMATS: dict[str, str] = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+
+def period_of(date_time: Any, period: Period) -> ColumnElement[str]:
+    """
+    Period of unix time as text, e.g. '2024-02' for month
+    """
+    return func.strftime(PERIOD_FORMATS[period], date_time, 'unixepoch', 'localtime')
+
+
+def between(stmt: Select, start: int | None, end: int | None) -> Select:
+    """
+    Filter by time of tickets, start is included, end is excluded
+    """
+    if start is not None:
+        stmt = stmt.where(TicketORM.date_time >= start)
+    if end is not None:
+        stmt = stmt.where(TicketORM.date_time < end)
+    return stmt
+
+
+def execute(stmt: Select) -> Sequence[Row]:
+    with session_factory() as session:
+        return session.execute(stmt).all()
+
+
+def spending_by_category(start: int | None = None, end: int | None = None) -> Sequence[Row]:
+    """
+    Sum and number of purchases by category
+    :param start: unix time of the first ticket
+    :param end: unix time after the last ticket
+    :return: rows (category_id, category, total, count) sorted by total
+    """
+    total = func.sum(PurchaseORM.sum).label('total')
+    stmt = (select(CategoryORM.id.label('category_id'), CategoryORM.name.label('category'),
+                   total, func.count(PurchaseORM.id).label('count'))
+            .select_from(PurchaseORM)
+            .join(ProductORM, PurchaseORM.product_id == ProductORM.id)
+            .join(CategoryORM, ProductORM.category_id == CategoryORM.id)
+            .join(TicketORM, PurchaseORM.ticket_id == TicketORM.id)
+            .group_by(CategoryORM.id)
+            .order_by(total.desc()))
+    return execute(between(stmt, start, end))
+
+
+def spending_by_storage(start: int | None = None, end: int | None = None) -> Sequence[Row]:
+    """
+    Sum and number of tickets by storage
+    :return: rows (inn, storage, total, count) sorted by total
+    """
+    total = func.sum(TicketORM.total_sum).label('total')
+    stmt = (select(StorageORM.inn, StorageORM.name.label('storage'),
+                   total, func.count(TicketORM.id).label('count'))
+            .select_from(TicketORM)
+            .join(StorageORM, TicketORM.storage_inn == StorageORM.inn)
+            .group_by(StorageORM.inn)
+            .order_by(total.desc()))
+    return execute(between(stmt, start, end))
+
+
+def spending_by_period(period: Period = 'month',
+                       start: int | None = None,
+                       end: int | None = None,
+                       *,
+                       category_id: int | None = None,
+                       storage_inn: int | None = None) -> Sequence[Row]:
+    """
+    Sum and number of tickets by day, week, month or year
+    :param category_id: only purchases of the category are summed, count is number of purchases
+    :param storage_inn: only tickets of the storage
+    :return: rows (period, total, count) sorted by period
+    """
+    period_column = period_of(TicketORM.date_time, period).label('period')
+    if category_id is None:
+        stmt = (select(period_column,
+                       func.sum(TicketORM.total_sum).label('total'),
+                       func.count(TicketORM.id).label('count'))
+                .select_from(TicketORM))
+    else:
+        stmt = (select(period_column,
+                       func.sum(PurchaseORM.sum).label('total'),
+                       func.count(PurchaseORM.id).label('count'))
+                .select_from(PurchaseORM)
+                .join(TicketORM, PurchaseORM.ticket_id == TicketORM.id)
+                .join(ProductORM, PurchaseORM.product_id == ProductORM.id)
+                .where(ProductORM.category_id == category_id))
+    if storage_inn is not None:
+        stmt = stmt.where(TicketORM.storage_inn == storage_inn)
+    stmt = stmt.group_by(period_column).order_by(period_column)
+    return execute(between(stmt, start, end))
@@ -1,10 +1,14 @@
-from typing import Any, Sequence
+from types import SimpleNamespace
+from typing import Any, Iterable, Iterator, Mapping, Sequence
 
-from sqlalchemy import delete, func, select, update, insert
-from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy import Select, delete, func, select, tuple_, update, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import InstrumentedAttribute, Session
 
-from .base import session_factory
-from .models import TicketORM, ProductORM, CategoryORM, NalogSessionORM, QRCodeORM
+from .base import session_factory, DTO
+from .cache import product_cache
+from .models import (TicketORM, ProductORM, CategoryORM, NalogSessionORM, QRCodeORM, QRImageORM, TicketIdORM,
+                     StorageORM, PurchaseORM)
 
 
 class Repository:
@@ -30,12 +34,100 @@ class Repository:
             return session.get_one(cls.model, pk)
 
     @classmethod
-    def list(cls, *, filter_by: dict[str, Any] | None = None) -> Sequence[Any]:
+    def value(cls, pk: Any, column: InstrumentedAttribute) -> Any | None:
+        stmt = select(column).where(cls.pk == pk)
+        with session_factory() as session:
+            return session.execute(stmt).scalar()
+
+    @classmethod
+    def list(cls, *,
+             filter_by: dict[str, Any] | None = None,
+             columns: Sequence[InstrumentedAttribute] | None = None,
+             map: bool = False) -> Sequence[Any]:
+        """
+        :param columns: read only these columns as named tuples instead of ORM objects
+        :param map: read rows as mappings, all columns if columns are not set
+        """
         if filter_by is None:
             filter_by = {}
-        stmt = select(cls.model).filter_by(**filter_by)
+        stmt = cls._select(columns, map).filter_by(**filter_by)
+        with session_factory() as session:
+            return cls._fetch(session, stmt, columns, map)
+
+    @classmethod
+    def iter(cls, *,
+             batch_size: int = 1000,
+             filter_by: dict[str, Any] | None = None,
+             order_by: InstrumentedAttribute | None = None,
+             columns: Sequence[InstrumentedAttribute] | None = None,
+             map: bool = False) -> Iterator[Any]:
+        """
+        Iterate over rows by keyset pagination, every batch is read by own query and session
+        :param batch_size: rows in one query
+        :param order_by: not nullable column, rows are ordered by it and the primary key
+        :param columns: see Repository.page
+        :param map: see Repository.page
+        """
+        after = None
+        while True:
+            rows = cls.page(after=after, limit=batch_size, filter_by=filter_by, order_by=order_by,
+                            columns=columns, map=map)
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after = cls.key(rows[-1], order_by)
+
+    @classmethod
+    def page(cls, *,
+             after: Any = None,
+             limit: int = 50,
+             filter_by: dict[str, Any] | None = None,
+             order_by: InstrumentedAttribute | None = None,
+             columns: Sequence[InstrumentedAttribute] | None = None,
+             map: bool = False) -> Sequence[Any]:
+        """
+        Get rows after the key of the last row of the previous page
+        :param after: key of the last row, see Repository.key, None - the first page
+        :param order_by: not nullable column, rows are ordered by it and the primary key
+        :param columns: read only these columns as named tuples, columns of the key are added if missed
+        :param map: read rows as mappings, all columns if columns are not set
+        """
+        keys = [cls.pk] if order_by is None else [order_by, cls.pk]
+        if columns:
+            columns = [*columns, *(key for key in keys if key not in columns)]
+        stmt = cls._select(columns, map).filter_by(**filter_by or {}).order_by(*keys).limit(limit)
+        if after is not None:
+            stmt = stmt.where(cls.pk > after if order_by is None else tuple_(*keys) > tuple_(*after))
         with session_factory() as session:
-            return session.scalars(stmt).all()
+            return cls._fetch(session, stmt, columns, map)
+
+    @classmethod
+    def key(cls, row: Any, order_by: InstrumentedAttribute | None = None) -> Any:
+        """
+        Key of the row for Repository.page, the primary key or a tuple (order_by, primary key)
+        """
+        if isinstance(row, Mapping):
+            row = SimpleNamespace(**row)
+        if order_by is None:
+            return getattr(row, cls.pk.key)
+        return getattr(row, order_by.key), getattr(row, cls.pk.key)
+
+    @classmethod
+    def _select(cls, columns: Sequence[InstrumentedAttribute] | None, map: bool) -> Select:
+        if columns:
+            return select(*columns)
+        if map:
+            return select(*cls.model.__table__.columns)
+        return select(cls.model)
+
+    @staticmethod
+    def _fetch(session: Session, stmt: Select,
+               columns: Sequence[InstrumentedAttribute] | None, map: bool) -> Sequence[Any]:
+        if map:
+            return session.execute(stmt).mappings().all()
+        if columns:
+            return session.execute(stmt).all()
+        return session.scalars(stmt).all()
 
     @classmethod
     def count(cls) -> int:
@@ -77,11 +169,121 @@ class QRCodeStorage(Repository):
     model = QRCodeORM
     pk = QRCodeORM.qr
 
+    @classmethod
+    def add_new(cls, qrs: Iterable[str]) -> set[str]:
+        """
+        Add qr codes by one insert, stored ones are kept with their tickets json
+        :return: added qr codes
+        """
+        values = [{'qr': qr} for qr in dict.fromkeys(qrs)]
+        if not values:
+            return set()
+        stmt = sqlite_insert(QRCodeORM).on_conflict_do_nothing().returning(QRCodeORM.qr)
+        with session_factory() as session:
+            new = set(session.scalars(stmt, values))
+            session.commit()
+            return new
+
+
+class QRImageStorage(Repository):
+    model = QRImageORM
+    pk = QRImageORM.sha256
+
+    @classmethod
+    def find(cls, *, sha256: str | None = None, **filter_by: Any) -> QRImageORM | None:
+        """
+        Find decoded image by content hash or by path, size and mtime
+        """
+        with session_factory() as session:
+            if sha256 is not None:
+                return session.get(QRImageORM, sha256)
+            return session.scalars(select(QRImageORM).filter_by(**filter_by)).first()
+
+    @classmethod
+    def save(cls, values: dict[str, Any]) -> None:
+        """
+        Add decoded image or update it with new path, size and mtime
+        """
+        stmt = sqlite_insert(QRImageORM).values(values)
+        stmt = stmt.on_conflict_do_update(index_elements=[QRImageORM.sha256],
+                                          set_={key: stmt.excluded[key] for key in values if key != 'sha256'})
+        with session_factory() as session:
+            session.execute(stmt)
+            session.commit()
+
+
+class TicketIdStorage(Repository):
+    model = TicketIdORM
+    pk = TicketIdORM.qr
+
 
 class TicketStorage(Repository):
     model = TicketORM
     pk = TicketORM.id
 
+    @classmethod
+    def save_many(cls, tickets: Iterable[DTO], category_id: int) -> set[str]:
+        """
+        Save parsed tickets in one transaction by executemany inserts, already stored tickets are skipped
+        :param tickets: TicketParser or records of receipts.fast_parse
+        :param category_id: category of new products
+        :return: ids of saved tickets
+        """
+        new: dict[str, dict[str, Any]] = {}
+        for ticket in tickets:
+            data = ticket.model_dump()
+            new.setdefault(data['id'], data)
+        if not new:
+            return set()
+        # stored products are resolved by the cache before the transaction, it reads by own session
+        products = {purchase['product']['name']: purchase['product']
+                    for ticket in new.values() for purchase in ticket['purchases']}
+        product_ids = product_cache.ids(products)
+
+        with session_factory() as session:
+            stored = session.scalars(select(TicketORM.id).where(TicketORM.id.in_(new)))
+            for ticket_id in stored:
+                del new[ticket_id]
+            if not new:
+                return set()
+
+            storages = {ticket['storage']['inn']: ticket['storage'] for ticket in new.values()}
+            session.execute(sqlite_insert(StorageORM).on_conflict_do_nothing(), list(storages.values()))
+            # qr codes without tickets may be stored already, e.g. by a scan of images
+            qr_codes = sqlite_insert(QRCodeORM)
+            qr_codes = qr_codes.on_conflict_do_update(index_elements=[QRCodeORM.qr],
+                                                      set_={'json_': qr_codes.excluded.json_})
+            session.execute(qr_codes, [ticket['qr_code'] for ticket in new.values()])
+
+            missing = [product | {'category_id': category_id}
+                       for name, product in products.items() if name not in product_ids]
+            if missing:
+                # the cache may be stale, products inserted by another process are ignored by the insert,
+                # so ids of all missing names are selected again in the transaction
+                session.execute(sqlite_insert(ProductORM).on_conflict_do_nothing(), missing)
+                stmt = select(ProductORM.name, ProductORM.id).where(
+                    ProductORM.name.in_([product['name'] for product in missing]))
+                product_ids.update({name: product_id for name, product_id in session.execute(stmt)})
+
+            session.execute(insert(TicketORM), [
+                {'id': ticket['id'],
+                 'date_time': ticket['date_time'],
+                 'total_sum': ticket['total_sum'],
+                 'qr': ticket['qr_code']['qr'],
+                 'storage_inn': ticket['storage']['inn']}
+                for ticket in new.values()
+            ])
+            session.execute(insert(PurchaseORM), [
+                {'ticket_id': ticket['id'],
+                 'product_id': product_ids[purchase['product']['name']],
+                 'price': purchase['price'],
+                 'quantity': purchase['quantity'],
+                 'sum': purchase['sum']}
+                for ticket in new.values() for purchase in ticket['purchases']
+            ])
+            session.commit()
+        return set(new)
+
 
 class ProductStorage(Repository):
     model = ProductORM
@@ -2,6 +2,8 @@ from pathlib import Path
 
 import pytest
 
+from sqlalchemy import delete
+
 from src.settings import settings
 from src.storage.base import Base
 from src.storage.base import engine, session_factory
@@ -23,6 +25,18 @@ def session():
         yield session
 
 
+@pytest.fixture
+def clean_db(session):
+    def clean():
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(delete(table))
+        session.commit()
+
+    clean()
+    yield
+    clean()
+
+
 @pytest.fixture(scope='session')
 def ticket_json() -> str:
     with open(BASE_DIR / "data/after_parser.json", encoding='utf-8') as file:
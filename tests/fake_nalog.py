@@ -0,0 +1,198 @@
+"""
+Local stand-in for 'rkkt_nalog' service (irkkt-mobile.nalog.ru), used by tests and benchmarks.
+Run standalone: python -m tests.fake_nalog --port 8888 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+BASE_DIR = Path(__file__).parent
+
+TICKET_DETAILS_RE = re.compile(r"/v2/tickets/(?P<ticket_id>[0-9a-f]+)")
+
+
+@dataclass
+class FakeNalogConfig:
+    """
+    :param latency: delay (seconds) of every response
+    :param error_rate: share of responses with status 503
+    :param session_lifetime: lifetime (seconds) of session, after it requests get status 401
+    :param ticket_file: ticket json returned for every qr code
+    """
+    latency: float = 0.0
+    error_rate: float = 0.0
+    session_lifetime: float = 3600.0
+    ticket_file: Path = BASE_DIR / "data/after_parser.json"
+    inn: str = '123456789012'
+    password: str = 'password'
+    client_secret: str = 'client_secret'
+
+
+@dataclass
+class FakeNalogState:
+    sessions: dict[str, float] = field(default_factory=dict)
+    refresh_tokens: set[str] = field(default_factory=set)
+    tickets: dict[str, str] = field(default_factory=dict)
+    requests: dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def count(self, path: str) -> None:
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def new_session(self) -> dict[str, str]:
+        session_id, refresh_token = uuid.uuid4().hex, str(uuid.uuid4())
+        with self.lock:
+            self.sessions[session_id] = time.monotonic()
+            self.refresh_tokens.add(refresh_token)
+        return {'sessionId': session_id, 'refresh_token': refresh_token}
+
+
+class FakeNalogHandler(BaseHTTPRequestHandler):
+    server: 'FakeNalogServer'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_POST(self):
+        body = self.read_json()
+        routes = {
+            '/v2/mobile/users/lkfl/auth': self.auth,
+            '/v2/mobile/users/refresh': self.refresh,
+            '/v2/ticket': self.ticket_id,
+        }
+        self.dispatch(routes.get(self.path), body)
+
+    def do_GET(self):
+        match = TICKET_DETAILS_RE.fullmatch(self.path)
+        handler = self.ticket_details if match else None
+        self.dispatch(handler, match['ticket_id'] if match else None, '/v2/tickets/{id}')
+
+    def dispatch(self, handler, arg, route: str | None = None) -> None:
+        config, state = self.server.config, self.server.state
+        state.count(route or self.path)
+        if config.latency:
+            time.sleep(config.latency)
+        if handler is None:
+            return self.reply(404, {'message': 'Not found'})
+        if random.random() < config.error_rate:
+            return self.reply(503, {'message': 'Service unavailable'})
+        handler(arg)
+
+    def auth(self, body: dict[str, Any]) -> None:
+        config = self.server.config
+        if (body.get('inn'), body.get('password'), body.get('client_secret')) != (
+                config.inn, config.password, config.client_secret):
+            return self.reply(400, {'message': 'Invalid credentials'})
+        self.reply(200, self.server.state.new_session())
+
+    def refresh(self, body: dict[str, Any]) -> None:
+        state = self.server.state
+        with state.lock:
+            refresh_token = body.get('refresh_token', '')
+            valid = refresh_token in state.refresh_tokens
+            state.refresh_tokens.discard(refresh_token)
+        if not valid:
+            return self.reply(401, {'message': 'Invalid refresh token'})
+        self.reply(200, state.new_session())
+
+    def ticket_id(self, body: dict[str, Any]) -> None:
+        if not self.authorized():
+            return
+        qr = body['qr']
+        ticket_id = hashlib.md5(qr.encode()).hexdigest()[:24]
+        with self.server.state.lock:
+            self.server.state.tickets[ticket_id] = qr
+        self.reply(200, {'kind': 'kkt', 'id': ticket_id, 'status': 2, 'statusReal': 2})
+
+    def ticket_details(self, ticket_id: str) -> None:
+        if not self.authorized():
+            return
+        qr = self.server.state.tickets.get(ticket_id)
+        if qr is None:
+            return self.reply(404, {'message': 'Ticket not found'})
+        ticket = self.server.ticket | {'id': ticket_id, 'qr': qr}
+        self.reply(200, ticket)
+
+    def authorized(self) -> bool:
+        created_at = self.server.state.sessions.get(self.headers.get('sessionId', ''))
+        if created_at is None or time.monotonic() - created_at > self.server.config.session_lifetime:
+            self.reply(401, {'message': 'Session expired'})
+            return False
+        return True
+
+    def read_json(self) -> dict[str, Any]:
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def reply(self, status: int, data: dict[str, Any]) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeNalogServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: FakeNalogConfig | None = None, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), FakeNalogHandler)
+        self.config = config or FakeNalogConfig()
+        self.state = FakeNalogState()
+        with open(self.config.ticket_file, encoding='utf-8') as file:
+            self.ticket = json.load(file)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = str(self.server_address[0]), self.server_address[1]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeNalogServer':
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> 'FakeNalogServer':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for 'rkkt_nalog' service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--session-lifetime', type=float, default=3600.0)
+    args = parser.parse_args()
+
+    config = FakeNalogConfig(latency=args.latency,
+                             error_rate=args.error_rate,
+                             session_lifetime=args.session_lifetime)
+    server = FakeNalogServer(config, args.host, args.port)
+    print(f"Fake nalog service on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
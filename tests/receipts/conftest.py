@@ -2,10 +2,12 @@ import pickle
 from pathlib import Path
 from typing import Any
 
+import cv2
+import numpy as np
 import pytest
 from sqlalchemy import delete
 
-from src.storage.models import NalogSessionORM
+from src.storage.models import NalogSessionORM, TicketIdORM
 
 BASE_DIR = Path(__file__).parent.parent
 
@@ -17,6 +19,13 @@ def not_nalog_authorized(session):
         session.commit()
 
 
+@pytest.fixture
+def without_ticket_ids(session):
+    with session:
+        session.execute(delete(TicketIdORM))
+        session.commit()
+
+
 @pytest.fixture
 def nalog_authorized(session):
     with session:
@@ -32,10 +41,18 @@ def valid_image() -> str:
 
 
 @pytest.fixture(scope='session')
-def invalid_image() -> str:
+def rotated_image() -> str:
+    """Photo of a receipt, its QR code is decoded only by the rotate stage"""
     return str(BASE_DIR / "data/invalid_qr_code.jpeg")
 
 
+@pytest.fixture(scope='session')
+def blank_image(tmp_path_factory) -> str:
+    filename = str(tmp_path_factory.mktemp('images') / "blank.png")
+    cv2.imwrite(filename, np.full((400, 300), 255, dtype=np.uint8))
+    return filename
+
+
 @pytest.fixture(scope='session')
 def qr_code() -> str:
     return 't=20240215T1156&s=967.00&fn=7281440500961252&i=29686&fp=1281831186&n=1'
@@ -0,0 +1,178 @@
+import asyncio
+import os
+from unittest.mock import patch, AsyncMock, Mock, call
+
+import httpx
+import pytest
+from pydantic import ValidationError
+
+from src.receipts.async_nalog_api import (AsyncNalogClient,
+                                          async_authorization,
+                                          async_get_ticket_api,
+                                          async_get_ticket_id_api,
+                                          async_refresh_session)
+from src.receipts.nalog_api import INN_AUTH_PATH, TICKET_ID_PATH
+from src.settings import NALOG_LOG_FILE as log_file
+from tests.fake_nalog import FakeNalogConfig, FakeNalogServer
+
+
+@patch('src.receipts.async_nalog_api.client', new_callable=AsyncMock)
+class TestAsyncNalogApi:
+
+    def test_authorization(self, mock_client):
+        mock = Mock()
+        mock.status_code = 200
+        mock.json.return_value = {
+            "sessionId": "66054fd6ba091652868559ca:aa1b8336-af0b-4adc-bbc2-0e664692aff1",
+            "refresh_token": "3b4378cb-cfa0-4ab6-a07e-dc9095822106",
+        }
+        mock_client.post.return_value = mock
+
+        resp = asyncio.run(async_authorization('inn', 'inn', 'password', client_secret='test'))
+
+        assert resp.session_id == "66054fd6ba091652868559ca:aa1b8336-af0b-4adc-bbc2-0e664692aff1"
+        assert resp.refresh_token == "3b4378cb-cfa0-4ab6-a07e-dc9095822106"
+        assert mock_client.post.call_args == call(
+            '/v2/mobile/users/lkfl/auth',
+            json={'inn': 'inn', 'client_secret': 'test', 'password': 'password'},
+            idempotent=False
+        )
+
+    def test_authorization_negative(self, mock_client):
+        mock = Mock()
+        mock.status_code = 'test'
+        mock_client.post.return_value = mock
+
+        old_log_file_size = os.path.getsize(log_file)
+
+        assert asyncio.run(async_authorization('inn', 'inn', 'password', client_secret='test')) is None
+
+        new_log_file_size = os.path.getsize(log_file)
+
+        assert old_log_file_size < new_log_file_size
+
+    def test_refresh_session(self, mock_client):
+        mock = Mock()
+        mock.status_code = 200
+        mock.json.return_value = {
+            "sessionId": "new_session_id",
+            "refresh_token": "new_refresh_token",
+        }
+        mock_client.post.return_value = mock
+
+        resp = asyncio.run(async_refresh_session(session_id='test',
+                                                 refresh_token='test',
+                                                 client_secret='test'))
+
+        assert resp.session_id == "new_session_id"
+        assert resp.refresh_token == "new_refresh_token"
+        assert mock_client.post.call_args == call(
+            '/v2/mobile/users/refresh',
+            json={'refresh_token': 'test', 'client_secret': 'test'},
+            session_id='test',
+            idempotent=False
+        )
+
+    def test_get_ticket_api(self, mock_client, ticket_json):
+        mock = Mock()
+        mock.status_code = 200
+        mock.text = ticket_json
+        mock.json.return_value = {"kind": "kkt", "id": "65ce3280ae17240837feb2c1", "status": 2, "statusReal": 2}
+        mock_client.get.return_value = mock
+        mock_client.post.return_value = mock
+
+        assert asyncio.run(async_get_ticket_api('qr_code', 'session_id')) == ticket_json
+        assert mock_client.get.call_args == call(
+            "/v2/tickets/65ce3280ae17240837feb2c1",
+            session_id='session_id'
+        )
+
+    def test_get_ticket_api_with_ticket_id(self, mock_client, ticket_json):
+        mock = Mock()
+        mock.status_code = 200
+        mock.text = ticket_json
+        mock_client.get.return_value = mock
+
+        assert asyncio.run(async_get_ticket_api('qr_code', 'session_id', 'ticket_id')) == ticket_json
+        assert mock_client.post.call_count == 0
+        assert mock_client.get.call_args == call("/v2/tickets/ticket_id", session_id='session_id')
+
+    def test_get_ticket_id_api(self, mock_client):
+        mock = Mock()
+        mock.status_code = 200
+        mock.json.return_value = {"id": "65ce3280ae17240837feb2c1"}
+        mock_client.post.return_value = mock
+
+        assert asyncio.run(async_get_ticket_id_api('qr_code', 'session_id')) == "65ce3280ae17240837feb2c1"
+
+    def test_get_ticket_api_concurrent_sessions(self, mock_client, ticket_json):
+        mock = Mock()
+        mock.status_code = 200
+        mock.text = ticket_json
+        mock.json.return_value = {"id": "65ce3280ae17240837feb2c1"}
+        mock_client.get.return_value = mock
+        mock_client.post.return_value = mock
+
+        async def fetch_all():
+            return await asyncio.gather(*(async_get_ticket_api('qr_code', f'session_{i}')
+                                          for i in range(5)))
+
+        assert asyncio.run(fetch_all()) == [ticket_json] * 5
+        sessions = [c.kwargs['session_id'] for c in mock_client.get.call_args_list]
+        assert sorted(sessions) == [f'session_{i}' for i in range(5)]
+
+    def test_get_ticket_api_negative(self, mock_client):
+        mock = Mock()
+        mock.status_code = 'test'
+        mock_client.post.return_value = mock
+
+        old_log_file_size = os.path.getsize(log_file)
+
+        assert asyncio.run(async_get_ticket_api('qr_code', 'session_id')) is None
+
+        new_log_file_size = os.path.getsize(log_file)
+
+        assert old_log_file_size < new_log_file_size
+
+    def test_get_ticket_api_invalid_args(self, mock_client):
+        with pytest.raises(ValidationError):
+            asyncio.run(async_get_ticket_api(1, 'session_id'))
+
+
+def test_client_in_many_event_loops():
+    with FakeNalogServer(FakeNalogConfig()) as server:
+        client = AsyncNalogClient(base_url=server.url)
+
+        async def post():
+            return (await client.post(INN_AUTH_PATH, json={})).status_code
+
+        # every asyncio.run has own event loop, connections of the closed one are not reused
+        assert asyncio.run(post()) == 400
+        assert asyncio.run(post()) == 400
+
+        async def close():
+            await client.aclose()
+
+        asyncio.run(close())
+
+
+def test_retry_not_idempotent():
+    with FakeNalogServer(FakeNalogConfig(error_rate=1)) as server:
+        client = AsyncNalogClient(base_url=server.url, retries=2, backoff=0.01)
+
+        async def post():
+            auth = await client.post(INN_AUTH_PATH, json={}, idempotent=False)
+            ticket_id = await client.post(TICKET_ID_PATH, json={})
+            await client.aclose()
+            return auth.status_code, ticket_id.status_code
+
+        assert asyncio.run(post()) == (503, 503)
+        assert server.state.requests == {INN_AUTH_PATH: 1, TICKET_ID_PATH: 3}
+        url = server.url
+
+    # the server is stopped, the connection is refused and the request is repeated
+    client = AsyncNalogClient(base_url=url, retries=1, backoff=0.01)
+    with patch('src.receipts.async_nalog_api.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        with pytest.raises(httpx.ConnectError):
+            asyncio.run(client.post(INN_AUTH_PATH, json={}, idempotent=False))
+    assert mock_sleep.call_count == 1
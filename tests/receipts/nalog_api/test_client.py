@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, call
+
+from src.receipts.nalog_api import NalogClient, headers as shared_headers, session_headers
+
+
+class TestNalogClient:
+
+    def test_pool(self):
+        with NalogClient(pool_size=3) as client:
+            adapter = client.session.get_adapter('https://irkkt-mobile.nalog.ru:8888')
+            assert adapter._pool_maxsize == 3
+            assert adapter._pool_block is True
+            assert client.session.headers['Connection'] == 'keep-alive'
+
+    def test_without_keep_alive(self):
+        with NalogClient(keep_alive=False) as client:
+            assert client.session.headers['Connection'] == 'close'
+
+    def test_timeout(self):
+        client = NalogClient(base_url='http://localhost:8888/', timeout=5)
+        with patch.object(client, 'session') as mock_session:
+            client.post('/path', json={})
+            client.get('/path', timeout=1)
+
+        assert mock_session.post.call_args == call('http://localhost:8888/path', json={},
+                                                   headers=shared_headers, timeout=5)
+        assert mock_session.get.call_args == call('http://localhost:8888/path',
+                                                  headers=shared_headers, timeout=1)
+
+    def test_session_headers(self, headers):
+        assert session_headers() == headers
+        assert session_headers('session_id') == headers | {'sessionId': 'session_id'}
+        assert 'sessionId' not in shared_headers
+
+    def test_concurrent_sessions(self):
+        client = NalogClient()
+        with patch.object(client, 'session') as mock_session:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                list(executor.map(lambda i: client.get('url', session_id=f'session_{i}'), range(20)))
+
+        sessions = sorted(c.kwargs['headers']['sessionId'] for c in mock_session.get.call_args_list)
+        assert sessions == sorted(f'session_{i}' for i in range(20))
+        assert 'sessionId' not in shared_headers
@@ -0,0 +1,69 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from src.receipts.exceptions import NalogAuthError
+from src.receipts.nalog_api import NalogClient, authorization, get_ticket_api, refresh_session
+from tests.fake_nalog import FakeNalogConfig, FakeNalogServer
+
+
+@pytest.fixture
+def fake_config() -> FakeNalogConfig:
+    return FakeNalogConfig()
+
+
+@pytest.fixture
+def fake_nalog(fake_config):
+    with FakeNalogServer(fake_config) as server:
+        with NalogClient(base_url=server.url, retries=3, backoff=0.01) as client:
+            with patch('src.receipts.nalog_api.client', client):
+                yield server
+
+
+def auth(config: FakeNalogConfig):
+    return authorization('inn', config.inn, config.password, client_secret=config.client_secret)
+
+
+def test_get_ticket_api(fake_nalog, fake_config, qr_code):
+    tokens = auth(fake_config)
+
+    ticket = json.loads(get_ticket_api(qr_code, tokens.session_id))
+
+    assert ticket['qr'] == qr_code
+    assert fake_nalog.state.requests == {'/v2/mobile/users/lkfl/auth': 1,
+                                         '/v2/ticket': 1,
+                                         '/v2/tickets/{id}': 1}
+
+
+def test_authorization_negative(fake_nalog, fake_config):
+    assert authorization('inn', fake_config.inn, 'invalid_password',
+                         client_secret=fake_config.client_secret) is None
+
+
+@pytest.mark.parametrize('fake_config', [FakeNalogConfig(session_lifetime=0)])
+def test_expired_session(fake_nalog, fake_config, qr_code):
+    tokens = auth(fake_config)
+
+    with pytest.raises(NalogAuthError):
+        get_ticket_api(qr_code, tokens.session_id)
+
+    new_tokens = refresh_session(session_id=tokens.session_id,
+                                 refresh_token=tokens.refresh_token,
+                                 client_secret=fake_config.client_secret)
+    assert new_tokens.session_id != tokens.session_id
+    assert refresh_session(session_id=tokens.session_id,
+                           refresh_token=tokens.refresh_token,
+                           client_secret=fake_config.client_secret) is None
+
+
+@pytest.mark.parametrize('fake_config', [FakeNalogConfig(error_rate=0.3)])
+def test_retry_unavailable(fake_nalog, fake_config, qr_code):
+    fake_config.error_rate = 0
+    tokens = auth(fake_config)
+    fake_config.error_rate = 0.3
+
+    with patch('src.receipts.nalog_api.time.sleep'):
+        results = [get_ticket_api(qr_code, tokens.session_id) for _ in range(10)]
+
+    assert sum(result is not None for result in results) >= 8
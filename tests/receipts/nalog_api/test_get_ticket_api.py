@@ -4,55 +4,80 @@ from unittest.mock import patch, MagicMock, Mock, call
 import pytest
 from pydantic import ValidationError
 
-from src.receipts.exceptions import NalogAPIError
-from src.receipts.nalog_api import get_ticket_api, _get_ticket_id
+from src.receipts.exceptions import NalogAPIError, NalogAuthError
+from src.receipts.nalog_api import get_ticket_api, get_ticket_id_api, _get_ticket_id
 from src.settings import NALOG_LOG_FILE as log_file
 
 
-@patch('src.receipts.nalog_api.requests')
+@patch('src.receipts.nalog_api.client.session')
 class TestNalogApi:
 
-    def test_get_ticket_id(self, mock_requests, headers):
+    def test_get_ticket_id(self, mock_session, headers):
         mock = Mock()
         mock.status_code = 200
         mock.json.return_value = {"kind": "kkt", "id": "65ce3280ae17240837feb2c1", "status": 2, "statusReal": 2}
-        mock_requests.post.return_value = mock
+        mock_session.post.return_value = mock
         headers['sessionId'] = 'session_id'
 
         assert _get_ticket_id('qr_code', 'session_id') == "65ce3280ae17240837feb2c1"
-        assert mock_requests.post.call_args == call(
+        assert mock_session.post.call_args == call(
             'https://irkkt-mobile.nalog.ru:8888/v2/ticket',
             json={'qr': 'qr_code'},
-            headers=headers
+            headers=headers,
+            timeout=10.0
         )
 
-    def test_get_ticket_id_negative(self, mock_requests):
+    def test_get_ticket_id_negative(self, mock_session):
         mock = Mock()
         mock.status_code = 'test'
-        mock_requests.post.return_value = mock
+        mock_session.post.return_value = mock
 
         with pytest.raises(NalogAPIError):
             _get_ticket_id('qr_code', 'session_id')
 
-    def test_get_ticket_api(self, mock_requests, ticket_json, headers):
+    def test_get_ticket_api(self, mock_session, ticket_json, headers):
         mock = MagicMock()
         mock.status_code = 200
         mock.text = ticket_json
         mock.json.return_value = {"kind": "kkt", "id": "65ce3280ae17240837feb2c1", "status": 2, "statusReal": 2}
-        mock_requests.get.return_value = mock
-        mock_requests.post.return_value = mock
+        mock_session.get.return_value = mock
+        mock_session.post.return_value = mock
         headers['sessionId'] = 'session_id'
 
         assert get_ticket_api('qr_code', 'session_id') == ticket_json
-        assert mock_requests.get.call_args == call(
+        assert mock_session.get.call_args == call(
             "https://irkkt-mobile.nalog.ru:8888/v2/tickets/65ce3280ae17240837feb2c1",
-            headers=headers
+            headers=headers,
+            timeout=10.0
         )
 
-    def test_get_ticket_api_negative(self, mock_requests):
+    def test_get_ticket_api_with_ticket_id(self, mock_session, ticket_json):
+        mock = Mock()
+        mock.status_code = 200
+        mock.text = ticket_json
+        mock_session.get.return_value = mock
+
+        assert get_ticket_api('qr_code', 'session_id', '65ce3280ae17240837feb2c1') == ticket_json
+        assert not mock_session.post.call_count
+        assert mock_session.get.call_args.args == (
+            "https://irkkt-mobile.nalog.ru:8888/v2/tickets/65ce3280ae17240837feb2c1",
+        )
+
+    def test_get_ticket_id_api(self, mock_session):
+        mock = Mock()
+        mock.status_code = 200
+        mock.json.return_value = {"kind": "kkt", "id": "65ce3280ae17240837feb2c1", "status": 2, "statusReal": 2}
+        mock_session.post.return_value = mock
+
+        assert get_ticket_id_api('qr_code', 'session_id') == "65ce3280ae17240837feb2c1"
+
+        mock.status_code = 'test'
+        assert get_ticket_id_api('qr_code', 'session_id') is None
+
+    def test_get_ticket_api_negative(self, mock_session):
         mock = Mock()
         mock.status_code = 'test'
-        mock_requests.post.return_value = mock
+        mock_session.post.return_value = mock
 
         old_log_file_size = os.path.getsize(log_file)
 
@@ -62,12 +87,20 @@ class TestNalogApi:
 
         assert old_log_file_size < new_log_file_size
 
-    def test_get_ticket_api_raise_exception(self, mock_requests):
+    def test_get_ticket_api_expired_session(self, mock_session):
+        mock = Mock()
+        mock.status_code = 401
+        mock_session.post.return_value = mock
+
+        with pytest.raises(NalogAuthError):
+            get_ticket_api('qr_code', 'session_id')
+
+    def test_get_ticket_api_raise_exception(self, mock_session):
         mock = Mock()
         mock.status_code = 200
         mock.json = Mock(side_effect=Exception)
-        mock_requests.get.return_value = mock
-        mock_requests.post.return_value = mock
+        mock_session.get.return_value = mock
+        mock_session.post.return_value = mock
 
         old_log_file_size = os.path.getsize(log_file)
 
@@ -77,7 +110,7 @@ class TestNalogApi:
 
         assert old_log_file_size < new_log_file_size
 
-    def test_get_ticket_api_invalid_args(self, mock_requests):
+    def test_get_ticket_api_invalid_args(self, mock_session):
         not_str_qr = 1
         not_str_session_id = 1
 
@@ -0,0 +1,54 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from pydantic_core import ValidationError
+
+from src.receipts.fast_parse import TicketRecord, parse_ticket, parse_ticket_fast
+from src.receipts.json_parse import TicketParser
+from src.storage.models import TicketORM
+
+
+def test_parse_ticket_fast(after_parser):
+    ticket = parse_ticket_fast(after_parser)
+
+    assert isinstance(ticket, TicketRecord)
+    assert ticket.model_dump() == TicketParser.model_validate_json(after_parser).model_dump()
+    assert ticket.qr_code.json_ == after_parser
+    assert parse_ticket_fast(after_parser.encode('utf-8')) == ticket
+
+
+def test_parse_ticket_fast_fallback(after_parser):
+    data = json.loads(after_parser)
+    data['ticket']['document']['receipt']['items'][0]['price'] = 7290.0
+
+    ticket = parse_ticket_fast(json.dumps(data, ensure_ascii=False))
+
+    assert isinstance(ticket, TicketParser)
+    assert ticket.purchases[0].price == 7290
+
+
+@pytest.mark.parametrize("after", ['fail json', '1', '{"id": "1"}'])
+def test_parse_ticket_fast_negative(after):
+    with pytest.raises(ValidationError):
+        parse_ticket_fast(after)
+
+
+def test_parse_ticket(after_parser):
+    with patch('src.receipts.fast_parse.settings') as mock_settings:
+        mock_settings.FAST_TICKET_PARSER = True
+        assert isinstance(parse_ticket(after_parser), TicketRecord)
+        mock_settings.FAST_TICKET_PARSER = False
+        assert isinstance(parse_ticket(after_parser), TicketParser)
+
+
+def test_from_record(after_parser):
+    ticket_orm = TicketORM.from_pydantic(parse_ticket_fast(after_parser))
+    expected = TicketORM.from_pydantic(TicketParser.model_validate_json(after_parser))
+
+    assert (ticket_orm.id, ticket_orm.date_time, ticket_orm.total_sum) == (
+        expected.id, expected.date_time, expected.total_sum)
+    assert [(p.product.name, p.price, p.quantity, p.sum) for p in ticket_orm.purchases] == [
+        (p.product.name, p.price, p.quantity, p.sum) for p in expected.purchases]
+    assert (ticket_orm.storage.inn, ticket_orm.storage.name) == (expected.storage.inn, expected.storage.name)
+    assert ticket_orm.qr_code.json_ == expected.qr_code.json_
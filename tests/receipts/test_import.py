@@ -0,0 +1,81 @@
+import importlib
+import json
+from unittest.mock import Mock, patch
+
+from pydantic import ValidationError
+
+from src.storage.models import ProductORM, PurchaseORM, QRCodeORM, StorageORM, TicketORM
+from src.storage.repository import QRCodeStorage
+
+bulk_import = importlib.import_module('src.receipts.import')
+
+
+def make_payload(ticket_json: str, i: int) -> str:
+    ticket = json.loads(ticket_json)
+    ticket['id'] = f"{i:024x}"
+    ticket['qr'] = f"t=20240211T1400&s=411.70&fn=7284440700373884&i={i}&fp=1152442848&n=1"
+    return json.dumps(ticket, ensure_ascii=False)
+
+
+def test_iter_payloads(tmp_path, ticket_json):
+    (tmp_path / 'dir').mkdir()
+    (tmp_path / 'dir/ticket.json').write_text(ticket_json, encoding='utf-8')
+    (tmp_path / 'dir/other.txt').write_text('other', encoding='utf-8')
+    lines = [make_payload(ticket_json, i) for i in range(3)]
+    (tmp_path / 'tickets.jsonl').write_text('\n'.join(lines) + '\n\n', encoding='utf-8')
+
+    payloads = list(bulk_import.iter_payloads([tmp_path / 'dir', tmp_path / 'tickets.jsonl']))
+
+    assert payloads[0] == ticket_json
+    assert [json.loads(payload) for payload in payloads[1:]] == [json.loads(line) for line in lines]
+
+
+def test_import_tickets(clean_db, session, ticket_json):
+    QRCodeStorage.add({'qr': json.loads(make_payload(ticket_json, 0))['qr'], 'json_': None})
+    payloads = [make_payload(ticket_json, i) for i in range(5)] + ['fail json']
+
+    stats = bulk_import.import_tickets(payloads, batch_size=2, category='Импорт')
+
+    assert (stats.read, stats.imported, stats.purchases, stats.skipped, stats.errors) == (6, 5, 15, 0, 1)
+    assert session.query(TicketORM).count() == 5
+    assert session.query(PurchaseORM).count() == 15
+    assert session.query(ProductORM).count() == 3
+    assert session.query(StorageORM).count() == 1
+    assert session.query(QRCodeORM).count() == 5
+    assert all(qr_code.json_ for qr_code in session.query(QRCodeORM))
+    assert {product.category.name for product in session.query(ProductORM)} == {'Импорт'}
+
+    stats = bulk_import.import_tickets(payloads[:2] + payloads[:2])
+
+    assert (stats.imported, stats.skipped) == (0, 4)
+    assert session.query(TicketORM).count() == 5
+
+
+def test_import_tickets_fast_parser(clean_db, session, ticket_json):
+    payloads = [make_payload(ticket_json, i) for i in range(3)] + ['fail json']
+
+    with patch('src.receipts.fast_parse.settings') as mock_settings:
+        mock_settings.FAST_TICKET_PARSER = True
+        with patch('src.receipts.fast_parse.TicketParser') as mock_parser:
+            mock_parser.model_validate_json.side_effect = ValidationError.from_exception_data('TicketParser', [])
+            stats = bulk_import.import_tickets(payloads)
+
+    # only the malformed payload falls back to TicketParser
+    assert mock_parser.model_validate_json.call_count == 1
+    assert (stats.imported, stats.purchases, stats.errors) == (3, 9, 1)
+    assert session.query(TicketORM).count() == 3
+
+
+
+def test_import_tickets_duplicates_and_failed_batch(clean_db, session, ticket_json):
+    payloads = [make_payload(ticket_json, i) for i in (0, 0, 1, 2, 3)]
+    save_many = bulk_import.TicketStorage.save_many
+    batches = iter([save_many, Mock(side_effect=RuntimeError), save_many])
+
+    with patch.object(bulk_import.TicketStorage, 'save_many',
+                      side_effect=lambda *args: next(batches)(*args)):
+        stats = bulk_import.import_tickets(payloads, batch_size=2)
+
+    # the duplicate is skipped and its purchases are not counted, the failed batch doesn't stop the import
+    assert (stats.read, stats.imported, stats.purchases, stats.skipped, stats.errors) == (5, 2, 6, 1, 2)
+    assert session.query(TicketORM).count() == 2
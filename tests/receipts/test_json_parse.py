@@ -1,12 +1,24 @@
+import io
+import json
+
 import pytest
 from pydantic_core import ValidationError
 
-from src.receipts.json_parse import TicketParser
+from src.receipts.json_parse import TicketParser, parse_tickets
 
 
 def test_ticket_parser(after_parser, before_parser):
     parser = TicketParser.model_validate_json(after_parser)
-    assert parser.model_dump() == before_parser
+    result = parser.model_dump()
+    assert result['qr_code']['json_'] == after_parser
+    assert json.loads(result['qr_code']['json_']) == json.loads(before_parser['qr_code']['json_'])
+    assert result | {'qr_code': {}} == before_parser | {'qr_code': {}}
+    assert result['qr_code']['qr'] == before_parser['qr_code']['qr']
+
+
+def test_ticket_parser_bytes(after_parser):
+    parser = TicketParser.model_validate_json(after_parser.encode('utf-8'))
+    assert parser.qr_code.json_ == after_parser
 
 
 @pytest.mark.parametrize("after",
@@ -15,3 +27,37 @@ def test_ticket_parser(after_parser, before_parser):
 def test_ticket_parser_negative(after):
     with pytest.raises(ValidationError):
         TicketParser.model_validate_json(after)
+
+
+def test_parse_tickets(after_parser, before_parser):
+    other = after_parser.replace('"id": "65c8979dba0916528679e92d"', '"id": "65c8979dba0916528679e92e"')
+    missing_receipt = json.dumps({'id': '1', 'qr': 'qr', 'ticket': {}})
+
+    first, error, second, blank = parse_tickets([after_parser, missing_receipt, other.encode('utf-8'), '\n'])
+
+    assert first.model_dump() == TicketParser.model_validate_json(after_parser).model_dump()
+    assert first.qr_code.json_ == after_parser.strip()
+    assert second.id == '65c8979dba0916528679e92e'
+    assert second.qr_code.json_ == other.strip()
+    assert isinstance(error, ValidationError)
+    assert isinstance(blank, ValidationError)
+
+
+def test_parse_tickets_invalid_json(after_parser):
+    first, error, not_utf8, last = parse_tickets([after_parser, 'fail json', b'\xff\xfe', after_parser])
+
+    assert first.id == TicketParser.model_validate_json(after_parser).id
+    assert isinstance(error, ValidationError)
+    assert isinstance(not_utf8, UnicodeDecodeError)
+    assert last.id == first.id
+
+
+def test_parse_tickets_jsonl(after_parser):
+    jsonl = io.BytesIO('\n'.join([json.dumps(json.loads(after_parser), ensure_ascii=False)] * 3).encode('utf-8'))
+
+    tickets = parse_tickets(jsonl)
+
+    assert isinstance(next(tickets), TicketParser)
+    # the rest of the stream is not read yet
+    assert jsonl.tell() < len(jsonl.getvalue())
+    assert all(isinstance(ticket, TicketParser) for ticket in tickets)
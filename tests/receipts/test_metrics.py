@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import pytest
+
+from src.receipts.async_nalog_api import AsyncNalogClient
+from src.receipts.metrics import MetricsRegistry, RequestStats, record_request, registry
+from src.receipts.nalog_api import NalogClient, INN_AUTH_PATH, TICKET_DETAILS_PATH
+from tests.fake_nalog import FakeNalogConfig, FakeNalogServer
+
+
+@pytest.fixture
+def fake_server():
+    with FakeNalogServer(FakeNalogConfig(latency=0.01)) as server:
+        yield server
+
+
+def test_registry():
+    metrics = MetricsRegistry()
+    metrics.counter('requests_total', "Requests")
+    metrics.histogram('request_seconds', "Time", buckets=(0.1, 1.0))
+
+    metrics.inc('requests_total', (('status', '200'),))
+    metrics.inc('requests_total', (('status', '200'),))
+    metrics.observe('request_seconds', 0.1)
+    metrics.observe('request_seconds', 0.5)
+    metrics.observe('request_seconds', 3)
+
+    data = json.loads(metrics.to_json())
+    assert data['requests_total']['samples'] == [{'labels': {'status': '200'}, 'value': 2}]
+    assert data['request_seconds']['samples'] == [{'labels': {},
+                                                   'buckets': {'0.1': 1, '1.0': 2, '+Inf': 3},
+                                                   'sum': 3.6,
+                                                   'count': 3}]
+
+    text = metrics.to_prometheus()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{status="200"} 2' in text
+    assert 'request_seconds_bucket{le="1.0"} 2' in text
+    assert 'request_seconds_count 3' in text
+
+    metrics.clear()
+    assert json.loads(metrics.to_json())['requests_total']['samples'] == []
+
+
+def test_endpoint():
+    assert RequestStats('GET', TICKET_DETAILS_PATH % '5f3bc6b953d5cb4f4e43a06c').endpoint == '/v2/tickets/{id}'
+    assert RequestStats('POST', INN_AUTH_PATH).endpoint == INN_AUTH_PATH
+
+
+def test_record_request():
+    registry.clear()
+    record_request(RequestStats('GET', '/v2/tickets/5f3bc6b953d5cb4f4e43a06c', status=200,
+                                dns=0.001, connect=0.01, ttfb=0.02, total=0.05, size=100, retries=1))
+
+    data = json.loads(registry.to_json())
+    labels = {'endpoint': '/v2/tickets/{id}'}
+    assert data['nalog_requests_total']['samples'] == [{'labels': labels | {'method': 'GET', 'status': '200'},
+                                                        'value': 1}]
+    assert data['nalog_retries_total']['samples'] == [{'labels': labels, 'value': 1}]
+    assert data['nalog_dns_seconds']['samples'][0]['count'] == 1
+    assert data['nalog_connect_seconds']['samples'][0]['count'] == 1
+    assert data['nalog_tls_seconds']['samples'] == []
+    registry.clear()
+
+
+def test_client_hooks(fake_server):
+    calls = []
+    with NalogClient(base_url=fake_server.url, hooks=[calls.append]) as client:
+        client.post(INN_AUTH_PATH, json={})
+        client.post(INN_AUTH_PATH, json={})
+
+    first, second = calls
+    assert (first.method, first.path, first.status) == ('POST', INN_AUTH_PATH, 400)
+    assert first.dns is not None and first.connect is not None and first.tls is None
+    assert first.ttfb >= 0.01
+    assert first.total >= first.ttfb
+    assert first.size > 0
+    # connection is reused
+    assert second.dns is None and second.connect is None
+
+
+def test_client_hooks_resolve_host(fake_server):
+    calls = []
+    # localhost may be resolved to ::1 first, the server listens 127.0.0.1 only
+    url = fake_server.url.replace('127.0.0.1', 'localhost')
+    with NalogClient(base_url=url, hooks=[calls.append]) as client:
+        assert client.post(INN_AUTH_PATH, json={}).status_code == 400
+
+    assert calls[0].dns is not None and calls[0].connect is not None
+
+
+def test_client_without_hooks(fake_server):
+    with NalogClient(base_url=fake_server.url) as client:
+        assert client.post(INN_AUTH_PATH, json={}).status_code == 400
+
+
+def test_async_client_hooks(fake_server):
+    calls = []
+
+    async def send():
+        async with AsyncNalogClient(base_url=fake_server.url, hooks=[calls.append]) as client:
+            await client.post(INN_AUTH_PATH, json={})
+            await client.post(INN_AUTH_PATH, json={})
+
+    asyncio.run(send())
+
+    first, second = calls
+    assert (first.method, first.path, first.status) == ('POST', INN_AUTH_PATH, 400)
+    # httpx doesn't trace DNS resolution, it's included in connect
+    assert first.dns is None and first.connect is not None and first.tls is None
+    assert first.ttfb >= 0.01
+    assert first.size > 0
+    assert second.connect is None
@@ -0,0 +1,59 @@
+import shutil
+
+import pytest
+
+from src.receipts import qr_cache
+from src.receipts.qr_cache import decode_file, lookup
+from src.storage.repository import QRImageStorage
+
+
+@pytest.fixture
+def decodings(monkeypatch):
+    calls = []
+
+    def decode_image(filename):
+        calls.append(filename)
+        return original(filename)
+
+    original = qr_cache.decode_image
+    monkeypatch.setattr(qr_cache, 'decode_image', decode_image)
+    return calls
+
+
+@pytest.mark.usefixtures('clean_db')
+def test_decode_file(tmp_path, valid_image, blank_image, qr_code, decodings):
+    image = tmp_path / 'receipt.jpeg'
+    shutil.copy(valid_image, image)
+
+    assert decode_file(image).qrcodes == [qr_code]
+    assert decode_file(image).qrcodes == [qr_code]
+    assert len(decodings) == 1
+
+    # moved image is found by the content hash
+    moved = tmp_path / 'saved' / 'receipt.jpeg'
+    moved.parent.mkdir()
+    image.replace(moved)
+    result = decode_file(moved)
+    assert (result.qrcodes, result.stage) == ([qr_code], 'gray')
+    assert len(decodings) == 1
+    assert QRImageStorage.find(sha256=lookup(moved).sha256).path == str(moved)
+
+    # undecodable image is cached too
+    assert decode_file(blank_image).qrcodes == []
+    assert decode_file(blank_image).qrcodes == []
+    assert len(decodings) == 2
+    assert QRImageStorage.count() == 2
+
+
+@pytest.mark.usefixtures('clean_db')
+def test_decode_file_without_cache(monkeypatch, valid_image, qr_code, decodings):
+    monkeypatch.setattr(qr_cache.settings, 'QR_DECODE_CACHE', False)
+    assert decode_file(valid_image).qrcodes == [qr_code]
+    assert decode_file(valid_image).qrcodes == [qr_code]
+    assert len(decodings) == 2
+    assert QRImageStorage.count() == 0
+
+
+def test_decode_file_negative():
+    with pytest.raises(FileNotFoundError):
+        decode_file('failed_name_file')
@@ -1,16 +1,124 @@
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
 import pytest
 
-from src.receipts.qr_code import QRCReader
-from src.settings import settings
+from src.receipts import qr_code
+from src.receipts.metrics import registry
+from src.receipts.qr_code import QRCReader, decode_staged, find_qr_regions
+
+
+def test_ticket_filter(valid_image, blank_image, qr_code):
+    reader = QRCReader()
+    assert reader.filter(valid_image) == [qr_code]
+    # results are not accumulated by the reader
+    assert reader.filter(valid_image) == [qr_code]
+    assert reader.filter(blank_image) == []
+    assert reader.all(valid_image) == [qr_code]
+    assert QRCReader(r'[0-9]+').filter(valid_image) == []
+    assert QRCReader(None).filter(valid_image) == [qr_code]
+
 
+@pytest.mark.parametrize('reduced', [False, True])
+def test_rotated_photo(rotated_image, reduced):
+    qr = 't=20240213T2123&s=1468.33&fn=7281440500984852&i=74275&fp=3319863436&n=1'
 
-def test_ticket_filter(valid_image, invalid_image, qr_code):
-    assert QRCReader(valid_image).filter(settings.TICKET_QR_FILTER) == [qr_code]
-    assert QRCReader(invalid_image).filter(settings.TICKET_QR_FILTER) == []
+    assert QRCReader(reduced=reduced).filter(rotated_image) == [qr]
+    assert QRCReader(reduced=reduced).decode(rotated_image).stage == 'rotate'
 
 
 def test_ticket_filter_negative():
     with pytest.raises(FileNotFoundError):
-        QRCReader('failed_name_file').filter(settings.TICKET_QR_FILTER)
+        QRCReader().filter('failed_name_file')
+    with pytest.raises(ValueError):
+        QRCReader().filter(b'not an image')
+
+
+def test_sources(valid_image, blank_image, qr_code):
+    with open(valid_image, 'rb') as file:
+        encoded = file.read()
+    image = cv2.imread(valid_image)
+    sources = [Path(valid_image), blank_image, encoded, image, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)]
+
+    pairs = QRCReader().iter(iter(sources))
+    assert next(pairs) == (sources[0], qr_code)
+    assert next(pairs) == (encoded, qr_code)
+    assert [qr for source, qr in pairs] == [qr_code, qr_code]
+
+    assert QRCReader(reduced=True).filter(encoded) == [qr_code]
+    assert QRCReader(reduced=True).filter(image) == [qr_code]
+
+
+def test_decode_stages(monkeypatch):
+    def decode_binary(image, pattern=None):
+        return ['qr'] if set(np.unique(image)) <= {0, 255} else []
+
+    monkeypatch.setattr(qr_code, 'decode_qr', decode_binary)
+    image = np.random.default_rng(1).integers(0, 256, (qr_code.MAX_SIDE * 2, 100), dtype=np.uint8)
+
+    result = decode_staged(image)
+    assert (result.qrcodes, result.stage) == (['qr'], 'threshold')
+    assert list(result.timings) == ['gray', 'downscale', 'threshold']
+
+    # small image isn't downscaled, all stages fail
+    monkeypatch.setattr(qr_code, 'decode_qr', lambda image, pattern=None: [])
+    result = decode_staged(image[:100])
+    assert (result.qrcodes, result.stage) == ([], None)
+    assert list(result.timings) == ['gray', 'threshold', 'sharpen', 'rotate']
+
+
+def test_decode_metrics(valid_image, blank_image):
+    registry.clear()
+    reader = QRCReader()
+    reader.filter(valid_image)
+    reader.filter(blank_image)
+
+    data = json.loads(registry.to_json())
+    decoded = {sample['labels']['stage']: sample['value'] for sample in data['qr_decoded_total']['samples']}
+    assert decoded == {'gray': 1, 'failed': 1}
+    attempts = {sample['labels']['stage']: sample['value'] for sample in data['qr_decode_attempts_total']['samples']}
+    assert attempts['gray'] == 2 and attempts['rotate'] == 1
+    registry.clear()
+
+
+def test_reduced_decode(valid_image, blank_image, qr_code):
+    reader = QRCReader(reduced=True)
+    result = reader.decode(valid_image)
+    assert (result.qrcodes, result.stage) == ([qr_code], 'roi_gray')
+    assert 'detect' in result.timings
+
+    result = reader.decode(blank_image)
+    assert (result.qrcodes, result.stage) == ([], None)
+    # no regions, the whole image is decoded
+    assert list(result.timings) == ['detect', 'gray', 'threshold', 'sharpen', 'rotate']
+
+
+def test_find_qr_regions():
+    image = np.full((200, 200), 255, dtype=np.uint8)
+    image[50:100, 120:170] = np.random.default_rng(1).choice([0, 0, 0, 255], (50, 50))  # dense modules
+    image[20:26, 10:110] = 0  # text line
+    assert find_qr_regions(image) == [(120, 50, 50, 50)]
+
+
+def test_reduced_decode_regions(monkeypatch, valid_image):
+    monkeypatch.setattr(qr_code, 'find_qr_regions', lambda image: [(i * 20, 0, 15, 15) for i in range(5)])
+    monkeypatch.setattr(qr_code, 'decode_qr', lambda image, pattern=None: [])
+    stages = []
+    decode_staged_ = qr_code.decode_staged
+
+    def decode_staged(image, pattern=None, stages_=qr_code.STAGES):
+        stages.append([stage.name for stage in stages_])
+        return decode_staged_(image, pattern, stages_)
+
+    monkeypatch.setattr(qr_code, 'decode_staged', decode_staged)
 
+    result = QRCReader(reduced=True).decode(valid_image)
 
+    # cheap stages of MAX_REGIONS regions, then all stages of the whole image
+    assert (result.qrcodes, result.stage) == ([], None)
+    assert stages[:-1] == [['gray', 'threshold']] * qr_code.MAX_REGIONS
+    assert stages[-1] == [stage.name for stage in qr_code.STAGES]
+    assert {'roi_gray', 'roi_threshold', 'rotate'} <= set(result.timings)
+    assert 'roi_rotate' not in result.timings
@@ -0,0 +1,34 @@
+import shutil
+
+from src.receipts.utils import scan_qr_images
+from src.storage.repository import QRCodeStorage
+
+
+def test_scan_qr_images(tmp_path, valid_image, blank_image, qr_code):
+    shutil.copy(valid_image, tmp_path / 'first.jpeg')
+    shutil.copy(valid_image, tmp_path / 'second.JPG')
+    shutil.copy(blank_image, tmp_path / 'blank.png')
+    (tmp_path / 'notes.txt').write_text('not an image')
+    (tmp_path / 'broken.jpeg').write_bytes(b'not an image')
+
+    result = scan_qr_images(tmp_path, max_workers=2)
+
+    assert result.qrcodes == {tmp_path / 'first.jpeg': [qr_code], tmp_path / 'second.JPG': [qr_code]}
+    assert result.failed == [tmp_path / 'blank.png', tmp_path / 'broken.jpeg']
+    assert result.added == {qr_code}
+    assert sorted(path.name for path in (tmp_path / 'saved').iterdir()) == ['first.jpeg', 'second.JPG']
+    assert sorted(path.name for path in (tmp_path / 'failed').iterdir()) == ['blank.png', 'broken.jpeg']
+    assert (tmp_path / 'notes.txt').exists()
+    assert QRCodeStorage.get(qr_code).json_ is None
+
+    # stored qr codes are kept with their json
+    QRCodeStorage.update(qr_code, {'json_': '{}'})
+    shutil.copy(valid_image, tmp_path / 'third.jpeg')
+    assert scan_qr_images(tmp_path, max_workers=1).added == set()
+    assert QRCodeStorage.get(qr_code).json_ == '{}'
+    QRCodeStorage.delete(qr_code)
+
+
+def test_scan_empty_directory(tmp_path):
+    result = scan_qr_images(tmp_path)
+    assert result.qrcodes == {} and result.failed == [] and result.added == set()
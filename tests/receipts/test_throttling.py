@@ -0,0 +1,115 @@
+import time
+from unittest.mock import patch, Mock
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from src.receipts.nalog_api import NalogClient
+from src.receipts.throttling import TokenBucket, backoff_delay
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.01, abs=0.005)
+
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.01
+
+
+def test_token_bucket_negative():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0, capacity=1)
+
+
+def test_backoff_delay():
+    assert 0 <= backoff_delay(0, 0.5, 30) <= 0.5
+    assert 0 <= backoff_delay(3, 0.5, 30) <= 4
+    assert 0 <= backoff_delay(10, 0.5, 30) <= 30
+    assert backoff_delay(0, 0.5, 30, retry_after='7') == 7
+    assert backoff_delay(0, 0.5, 30, retry_after='120') == 30
+
+
+@patch('src.receipts.nalog_api.time.sleep')
+class TestNalogClientRetry:
+
+    def test_retry_status(self, mock_sleep):
+        client = NalogClient(retries=3)
+        throttled = Mock(status_code=429, headers={'Retry-After': '2'})
+        unavailable = Mock(status_code=503, headers={})
+        ok = Mock(status_code=200)
+
+        with patch.object(client, 'session') as mock_session:
+            mock_session.post.side_effect = [throttled, unavailable, ok]
+            assert client.post('url') is ok
+
+        assert mock_session.post.call_count == 3
+        assert mock_sleep.call_count == 2
+        assert mock_sleep.call_args_list[0].args == (2.0,)
+
+    def test_retry_connection_error(self, mock_sleep):
+        client = NalogClient(retries=1)
+        ok = Mock(status_code=200)
+
+        with patch.object(client, 'session') as mock_session:
+            mock_session.get.side_effect = [requests.ConnectionError, ok]
+            assert client.get('url') is ok
+
+            mock_session.get.side_effect = requests.ConnectionError
+            with pytest.raises(requests.ConnectionError):
+                client.get('url')
+
+    def test_retries_exhausted(self, mock_sleep):
+        client = NalogClient(retries=2)
+        unavailable = Mock(status_code=503, headers={})
+
+        with patch.object(client, 'session') as mock_session:
+            mock_session.post.return_value = unavailable
+            assert client.post('url') is unavailable
+
+        assert mock_session.post.call_count == 3
+
+    def test_not_retry_client_error(self, mock_sleep):
+        client = NalogClient(retries=2)
+        not_found = Mock(status_code=404)
+
+        with patch.object(client, 'session') as mock_session:
+            mock_session.post.return_value = not_found
+            assert client.post('url') is not_found
+
+        assert mock_session.post.call_count == 1
+        assert not mock_sleep.call_count
+
+    def test_rate_limiter(self, mock_sleep):
+        rate_limiter = Mock()
+        client = NalogClient(rate_limiter=rate_limiter)
+
+        with patch.object(client, 'session'):
+            client.post('url')
+            client.get('url')
+
+        assert rate_limiter.acquire.call_count == 2
+
+    def test_not_idempotent(self, mock_sleep):
+        client = NalogClient(retries=2)
+        unavailable = Mock(status_code=503, headers={})
+        ok = Mock(status_code=200)
+        refused = requests.ConnectionError(MaxRetryError(None, 'url', NewConnectionError(None, 'refused')))
+
+        with patch.object(client, 'session') as mock_session:
+            mock_session.post.return_value = unavailable
+            assert client.post('url', idempotent=False) is unavailable
+            assert mock_session.post.call_count == 1
+
+            mock_session.post.side_effect = requests.ReadTimeout
+            with pytest.raises(requests.ReadTimeout):
+                client.post('url', idempotent=False)
+            assert mock_session.post.call_count == 2
+
+            mock_session.post.side_effect = [requests.ConnectTimeout, refused, ok]
+            assert client.post('url', idempotent=False) is ok
+            assert mock_session.post.call_count == 5
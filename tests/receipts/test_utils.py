@@ -1,17 +1,21 @@
-from unittest.mock import patch, Mock
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, Mock, call
 
 import pytest
 
+from src.receipts.exceptions import NalogAPIError, NalogAuthError, TicketNotReceivedError
 from src.receipts.nalog_api import SessionTokens
-from src.receipts.utils import get_qr_code, get_ticket, update_nalog_session, nalog_auth, replace_file
+from src.receipts.utils import (get_qr_code, get_ticket, get_tickets, SessionRefresher,
+                                update_nalog_session, nalog_auth, replace_file)
 from src.storage.models import NalogSessionORM
-from src.storage.repository import QRCodeStorage
+from src.storage.repository import QRCodeStorage, TicketIdStorage
 
 
-def test_get_qr_code(valid_image, invalid_image, qr_code):
+def test_get_qr_code(valid_image, blank_image, qr_code):
     assert get_qr_code(valid_image) == qr_code
     assert get_qr_code(valid_image) == qr_code
-    assert get_qr_code(invalid_image) == None
+    assert get_qr_code(blank_image) == None
     assert QRCodeStorage.count() == 1
     assert QRCodeStorage.get(qr_code).qr == qr_code
     assert QRCodeStorage.get(qr_code).json_ == None
@@ -60,7 +64,7 @@ class TestNalogAuth:
         assert mock_settings.auth_nalog is None
 
 
-@patch('src.receipts.utils.refresh_session')
+@patch('src.receipts.utils.request_refresh_session')
 @patch('src.receipts.utils.settings')
 class TestUpdateNalogSession:
     def test_update_nalog_session(self,
@@ -88,7 +92,7 @@ class TestUpdateNalogSession:
                                            session):
         mock_settings.auth_nalog = SessionTokens(session_id='session_id',
                                                  refresh_token='refresh_token')
-        mock_refresh_session.return_value = None
+        mock_refresh_session.side_effect = NalogAuthError(Mock(status_code=401))
 
         update_nalog_session()
 
@@ -108,15 +112,18 @@ class TestUpdateNalogSession:
         assert session.query(NalogSessionORM).count() == 0
 
 
-@patch('src.receipts.utils.update_nalog_session')
+@patch('src.receipts.utils.get_ticket_id_api', return_value='ticket_id')
+@patch('src.receipts.utils.session_refresher')
 @patch('src.receipts.utils.get_ticket_api')
 @patch('src.receipts.utils.settings')
+@pytest.mark.usefixtures('without_ticket_ids')
 class TestGetTicket:
 
     def test_get_ticket_with_fresh_tokens(self,
                                           mock_settings,
                                           mock_get_ticket_api,
-                                          mock_update_nalog_session,
+                                          mock_session_refresher,
+                                          mock_get_ticket_id_api,
                                           ticket_json):
         mock_settings.auth_nalog = SessionTokens(session_id='session_id',
                                                  refresh_token='refresh_token')
@@ -124,20 +131,68 @@ class TestGetTicket:
 
         assert get_ticket('qr_code') == ticket_json
         assert mock_get_ticket_api.call_count == 1
-        assert not mock_update_nalog_session.call_count
+        assert mock_get_ticket_api.call_args == call('qr_code', 'session_id', 'ticket_id')
+        assert mock_session_refresher.ensure_fresh.call_count == 1
+        assert not mock_session_refresher.refresh.call_count
+
+    def test_get_ticket_cached_ticket_id(self,
+                                         mock_settings,
+                                         mock_get_ticket_api,
+                                         mock_session_refresher,
+                                         mock_get_ticket_id_api,
+                                         ticket_json):
+        mock_settings.auth_nalog = SessionTokens(session_id='session_id',
+                                                 refresh_token='refresh_token')
+        mock_get_ticket_api.return_value = ticket_json
+
+        assert get_ticket('qr_code') == ticket_json
+        assert get_ticket('qr_code') == ticket_json
+        assert mock_get_ticket_id_api.call_count == 1
+        assert mock_get_ticket_api.call_count == 2
+        assert TicketIdStorage.get('qr_code').ticket_id == 'ticket_id'
+
+    def test_get_ticket_saved_json(self,
+                                   mock_settings,
+                                   mock_get_ticket_api,
+                                   mock_session_refresher,
+                                   mock_get_ticket_id_api,
+                                   ticket_json):
+        mock_settings.auth_nalog = SessionTokens(session_id='session_id',
+                                                 refresh_token='refresh_token')
+        QRCodeStorage.add({'qr': 'saved_qr_code', 'json_': ticket_json})
+
+        assert get_ticket('saved_qr_code') == ticket_json
+        assert not mock_get_ticket_id_api.call_count
+        assert not mock_get_ticket_api.call_count
+
+        QRCodeStorage.delete('saved_qr_code')
+
+    def test_get_ticket_id_negative(self,
+                                    mock_settings,
+                                    mock_get_ticket_api,
+                                    mock_session_refresher,
+                                    mock_get_ticket_id_api):
+        mock_settings.auth_nalog = SessionTokens(session_id='session_id',
+                                                 refresh_token='refresh_token')
+        mock_get_ticket_id_api.return_value = None
+
+        assert get_ticket('qr_code') is None
+        assert not mock_get_ticket_api.call_count
+        assert TicketIdStorage.count() == 0
 
     def test_get_ticket_without_fresh_tokens(self,
                                              mock_settings,
                                              mock_get_ticket_api,
-                                             mock_update_nalog_session,
+                                             mock_session_refresher,
+                                             mock_get_ticket_id_api,
                                              ticket_json):
         mock_settings.auth_nalog = SessionTokens(session_id='session_id',
                                                  refresh_token='refresh_token')
-        mock_get_ticket_api.side_effect = [None, ticket_json]
+        mock_get_ticket_api.side_effect = [NalogAuthError(Mock()), ticket_json]
 
         assert get_ticket('qr_code') == ticket_json
         assert mock_get_ticket_api.call_count == 2
-        assert mock_update_nalog_session.call_count == 1
+        assert mock_session_refresher.refresh.call_args == call('session_id')
 
     def test_get_ticket_without_authorization(self, mock_settings, *args):
         mock_settings.auth_nalog = None
@@ -148,14 +203,182 @@ class TestGetTicket:
     def test_get_ticket_negative(self,
                                  mock_settings,
                                  mock_get_ticket_api,
-                                 mock_update_nalog_session):
+                                 mock_session_refresher,
+                                 mock_get_ticket_id_api):
         mock_settings.auth_nalog = SessionTokens(session_id='session_id',
                                                  refresh_token='refresh_token')
         mock_get_ticket_api.return_value = None
 
+        assert get_ticket('qr_code') is None
+        assert mock_get_ticket_api.call_count == 1
+        assert not mock_session_refresher.refresh.call_count
+        assert TicketIdStorage.count() == 0
+
+    def test_get_ticket_auth_negative(self,
+                                      mock_settings,
+                                      mock_get_ticket_api,
+                                      mock_session_refresher,
+                                      mock_get_ticket_id_api):
+        mock_settings.auth_nalog = SessionTokens(session_id='session_id',
+                                                 refresh_token='refresh_token')
+        mock_get_ticket_api.side_effect = NalogAuthError(Mock())
+
         assert get_ticket('qr_code') is None
         assert mock_get_ticket_api.call_count == 2
-        assert mock_update_nalog_session.call_count == 1
+        assert mock_session_refresher.refresh.call_count == 1
+
+
+@patch('src.receipts.utils.NalogSessionStorage')
+@patch('src.receipts.utils.request_refresh_session')
+@patch('src.receipts.utils.settings')
+class TestSessionRefresher:
+
+    def test_refresh_single_flight(self,
+                                   mock_settings,
+                                   mock_refresh_session,
+                                   mock_storage):
+        mock_settings.auth_nalog = SessionTokens(session_id='old_session_id',
+                                                 refresh_token='old_refresh_token')
+        mock_refresh_session.return_value = SessionTokens(session_id='new_session_id',
+                                                          refresh_token='new_refresh_token')
+        refresher = SessionRefresher(lifetime=3600, refresh_ahead=60)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: refresher.refresh('old_session_id'), range(8)))
+        refresher.stop()
+
+        assert mock_refresh_session.call_count == 1
+        assert mock_storage.add.call_count == 1
+        assert mock_settings.auth_nalog.session_id == 'new_session_id'
+
+    def test_refresh_service_failure(self,
+                                     mock_settings,
+                                     mock_refresh_session,
+                                     mock_storage):
+        tokens = SessionTokens(session_id='session_id', refresh_token='refresh_token')
+        mock_settings.auth_nalog = tokens
+        mock_refresh_session.side_effect = ConnectionError
+        refresher = SessionRefresher(lifetime=3600, refresh_ahead=60, retry_delay=0.05)
+
+        refresher.refresh()
+
+        # the session is kept, the refresh is repeated later
+        assert mock_settings.auth_nalog == tokens
+        assert not mock_storage.delete_all.call_count
+        mock_refresh_session.side_effect = None
+        mock_refresh_session.return_value = SessionTokens(session_id='new_session_id',
+                                                          refresh_token='new_refresh_token')
+        time.sleep(0.2)
+        refresher.stop()
+
+        assert mock_refresh_session.call_count == 2
+        assert mock_settings.auth_nalog.session_id == 'new_session_id'
+
+    def test_ensure_fresh_backs_off(self,
+                                    mock_settings,
+                                    mock_refresh_session,
+                                    mock_storage):
+        mock_settings.auth_nalog = SessionTokens(session_id='session_id', refresh_token='refresh_token')
+        mock_refresh_session.side_effect = NalogAPIError(Mock(status_code=503))
+        refresher = SessionRefresher(lifetime=3600, refresh_ahead=60, retry_delay=60)
+        refresher.updated_at -= 3600
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: refresher.ensure_fresh(), range(8)))
+        # callers with the expired session don't request it again, the timer does
+        refresher.refresh('session_id')
+        refresher.stop()
+
+        assert mock_refresh_session.call_count == 1
+        assert refresher.backing_off
+        assert mock_settings.auth_nalog.session_id == 'session_id'
+
+    def test_readers_wait_for_refresh(self,
+                                      mock_settings,
+                                      mock_refresh_session,
+                                      mock_storage):
+        mock_settings.auth_nalog = SessionTokens(session_id='old_session_id',
+                                                 refresh_token='old_refresh_token')
+
+        def slow_refresh(**kwargs):
+            time.sleep(0.3)
+            return SessionTokens(session_id='new_session_id', refresh_token='new_refresh_token')
+
+        mock_refresh_session.side_effect = slow_refresh
+        refresher = SessionRefresher(lifetime=3600, refresh_ahead=60)
+
+        def read_session(_):
+            refresher.ensure_fresh()
+            return mock_settings.auth_nalog.session_id
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            refreshing = executor.submit(refresher.refresh)
+            time.sleep(0.05)
+            # the old session is kept during the request, readers wait for the new one
+            assert mock_settings.auth_nalog.session_id == 'old_session_id'
+            sessions = list(executor.map(read_session, range(3)))
+            refreshing.result()
+        refresher.stop()
+
+        assert sessions == ['new_session_id'] * 3
+        assert mock_refresh_session.call_count == 1
+
+    def test_ensure_fresh(self,
+                          mock_settings,
+                          mock_refresh_session,
+                          mock_storage):
+        mock_settings.auth_nalog = SessionTokens(session_id='old_session_id',
+                                                 refresh_token='old_refresh_token')
+        mock_refresh_session.return_value = SessionTokens(session_id='new_session_id',
+                                                          refresh_token='new_refresh_token')
+        refresher = SessionRefresher(lifetime=3600, refresh_ahead=60)
+
+        refresher.ensure_fresh()
+        assert not mock_refresh_session.call_count
+
+        refresher.updated_at -= 3600
+        assert refresher.expired
+        refresher.ensure_fresh()
+        refresher.stop()
+
+        assert mock_refresh_session.call_count == 1
+        assert not refresher.expired
+        assert mock_settings.auth_nalog.session_id == 'new_session_id'
+
+
+@patch('src.receipts.utils.get_ticket')
+@patch('src.receipts.utils.settings')
+class TestGetTickets:
+
+    def test_get_tickets(self, mock_settings, mock_get_ticket, ticket_json):
+        mock_settings.auth_nalog = SessionTokens(session_id='session_id',
+                                                 refresh_token='refresh_token')
+        mock_settings.NALOG_POOL_SIZE = 4
+        mock_get_ticket.side_effect = lambda qr: None if qr == 'failed' else ticket_json
+
+        result = dict(get_tickets(['qr_1', 'qr_2', 'failed'], max_workers=8))
+
+        assert mock_get_ticket.call_count == 3
+        assert result['qr_1'] == ticket_json
+        assert result['qr_2'] == ticket_json
+        assert isinstance(result['failed'], TicketNotReceivedError)
+
+    def test_get_tickets_raise_exception(self, mock_settings, mock_get_ticket):
+        mock_settings.auth_nalog = SessionTokens(session_id='session_id',
+                                                 refresh_token='refresh_token')
+        mock_settings.NALOG_POOL_SIZE = 4
+        mock_get_ticket.side_effect = ValueError
+
+        qr, error = next(get_tickets(['qr_code']))
+
+        assert qr == 'qr_code'
+        assert isinstance(error, ValueError)
+
+    def test_get_tickets_without_authorization(self, mock_settings, mock_get_ticket):
+        mock_settings.auth_nalog = None
+
+        with pytest.raises(RuntimeError):
+            next(get_tickets(['qr_code']))
 
 
 class TestReplaceFile:
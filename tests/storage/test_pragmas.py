@@ -0,0 +1,15 @@
+from sqlalchemy import text
+
+from src.settings import settings
+from src.storage.base import engine
+
+
+def test_pragmas():
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA foreign_keys")).scalar() == 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == settings.db.CACHE_SIZE
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == settings.db.BUSY_TIMEOUT
+        # WAL is not used by :memory: database
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == 'memory'
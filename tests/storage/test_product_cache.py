@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import event
+
+from src.storage.base import engine
+from src.storage.cache import ProductCache, product_cache
+from src.storage.models import PurchaseORM, ProductORM
+from src.storage.repository import CategoryStorage, ProductStorage
+
+
+@pytest.fixture
+def queries():
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+@pytest.fixture
+def products(clean_db):
+    category_id = CategoryStorage.add({'name': 'Продукты'})[0].id
+    product_cache.clear()
+    return ProductStorage.add([{'name': 'Хлеб', 'category_id': category_id},
+                               {'name': 'Молоко', 'category_id': category_id, 'provider_inn': 123}])
+
+
+def test_rows(products, queries):
+    cache = ProductCache()
+
+    assert set(cache.ids(['Хлеб', 'Молоко', 'Кефир'])) == {'Хлеб', 'Молоко'}
+    assert cache.rows(['Молоко'])['Молоко'].provider_inn == 123
+    assert cache.ids(['Хлеб', 'Кефир']) == {'Хлеб': products[0].id}
+    assert len(queries) == 1
+
+
+def test_lru(products, queries):
+    cache = ProductCache(maxsize=2)
+    cache.rows(['Хлеб'])
+    cache.rows(['Молоко', 'Кефир'])
+
+    assert len(cache) == 2
+    cache.rows(['Молоко', 'Кефир'])
+    assert len(queries) == 2
+    cache.rows(['Хлеб'])
+    assert len(queries) == 3
+
+
+def test_invalidation(products):
+    product_cache.ids(['Хлеб', 'Кефир'])
+    category_id = products[0].category_id
+
+    ProductStorage.add({'name': 'Кефир', 'category_id': category_id})
+    assert set(product_cache.ids(['Хлеб', 'Кефир'])) == {'Хлеб', 'Кефир'}
+
+    ProductStorage.update(products[0].id, {'name': 'Хлеб белый'})
+    assert 'Хлеб' not in product_cache.ids(['Хлеб'])
+
+    CategoryStorage.update(category_id, {'name': 'Еда'})
+    assert product_cache.rows(['Молоко'])['Молоко'].category_name == 'Еда'
+
+
+def test_products(products, session):
+    first = product_cache.products(['Хлеб'])['Хлеб']
+    second = product_cache.products(['Хлеб'])['Хлеб']
+
+    assert first is not second
+    assert (first.id, first.name, first.category.name) == (products[0].id, 'Хлеб', 'Продукты')
+
+    purchase = PurchaseORM()
+    purchase.price, purchase.quantity, purchase.sum = 100, 1, 100
+    purchase.product = first
+    session.add(purchase)
+    session.commit()
+
+    assert session.query(ProductORM).count() == 2
+    assert session.query(PurchaseORM).one().product_id == products[0].id
@@ -0,0 +1,76 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import inspect
+
+from src.receipts.json_parse import TicketParser
+from src.storage import reports
+from src.storage.base import engine
+from src.storage.migrations import migrate
+from src.storage.repository import CategoryStorage, ProductStorage, TicketStorage
+
+
+def make_ticket(ticket_json: str, i: int, date: datetime, inn: str = '0268040102') -> TicketParser:
+    ticket = json.loads(ticket_json)
+    ticket['id'] = f"{i:024x}"
+    ticket['qr'] = f"qr_{i}"
+    receipt = ticket['ticket']['document']['receipt']
+    receipt['dateTime'] = int(date.timestamp())
+    receipt['userInn'] = inn
+    return TicketParser.model_validate_json(json.dumps(ticket, ensure_ascii=False))
+
+
+@pytest.fixture
+def tickets(clean_db, ticket_json):
+    food, other = CategoryStorage.add([{'name': 'Продукты'}, {'name': 'Другое'}])
+    ProductStorage.add({'name': 'Хлеб Бородинский на закваске 300гр', 'category_id': other.id})
+    tickets = [make_ticket(ticket_json, 0, datetime(2024, 1, 10, 12)),
+               make_ticket(ticket_json, 1, datetime(2024, 1, 20, 12)),
+               make_ticket(ticket_json, 2, datetime(2024, 2, 5, 12), inn='7707083893')]
+    TicketStorage.save_many(tickets, food.id)
+    return food, other
+
+
+def test_spending_by_category(tickets):
+    food, other = tickets
+
+    rows = reports.spending_by_category()
+
+    assert [(row.category, row.total, row.count) for row in rows] == [('Продукты', 3 * 33880, 6),
+                                                                    ('Другое', 3 * 7290, 3)]
+    start = int(datetime(2024, 2, 1).timestamp())
+    assert [(row.category_id, row.total) for row in reports.spending_by_category(start)] == [
+        (food.id, 33880), (other.id, 7290)]
+
+
+def test_spending_by_storage(tickets):
+    rows = reports.spending_by_storage()
+
+    assert [(row.inn, row.total, row.count) for row in rows] == [(268040102, 2 * 41170, 2),
+                                                               (7707083893, 41170, 1)]
+
+
+def test_spending_by_period(tickets):
+    food, other = tickets
+
+    assert [tuple(row) for row in reports.spending_by_period('month')] == [('2024-01', 2 * 41170, 2),
+                                                                         ('2024-02', 41170, 1)]
+    assert [tuple(row) for row in reports.spending_by_period('day', storage_inn=268040102)] == [
+        ('2024-01-10', 41170, 1), ('2024-01-20', 41170, 1)]
+    assert [tuple(row) for row in reports.spending_by_period('year', category_id=other.id)] == [
+        ('2024', 3 * 7290, 3)]
+    end = int(datetime(2024, 1, 15).timestamp())
+    assert [tuple(row) for row in reports.spending_by_period('week', end=end)] == [('2024-W02', 41170, 1)]
+
+
+def test_migrate():
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_tickets_date_time")
+
+    migrate()
+
+    assert 'ix_tickets_date_time' in {index['name'] for index in inspect(engine).get_indexes('tickets')}
+    assert {'ix_purchases_ticket_id', 'ix_purchases_product_id'} <= {
+        index['name'] for index in inspect(engine).get_indexes('purchases')}
+    assert 'ix_products_category_id' in {index['name'] for index in inspect(engine).get_indexes('products')}
@@ -0,0 +1,62 @@
+import pytest
+
+from src.storage.models import ProductORM
+from src.storage.repository import CategoryStorage, ProductStorage
+
+
+@pytest.fixture
+def products(clean_db):
+    food, other = CategoryStorage.add([{'name': 'Продукты'}, {'name': 'Другое'}])
+    ProductStorage.add([{'name': f'product {i:02}', 'category_id': food.id if i % 2 else other.id}
+                        for i in reversed(range(25))])
+    return food, other
+
+
+def test_iter(products):
+    food, other = products
+
+    names = [product.name for product in ProductStorage.iter(batch_size=10)]
+    assert names == [f'product {i:02}' for i in reversed(range(25))]
+
+    rows = list(ProductStorage.iter(batch_size=5, filter_by={'category_id': food.id}, order_by=ProductORM.name))
+    assert [row.name for row in rows] == [f'product {i:02}' for i in range(1, 25, 2)]
+    assert rows[0].category.name == 'Продукты'
+
+    assert list(ProductStorage.iter(filter_by={'name': 'other'})) == []
+
+
+def test_page(products):
+    first = ProductStorage.page(limit=10, order_by=ProductORM.name)
+    second = ProductStorage.page(after=ProductStorage.key(first[-1], ProductORM.name), limit=10,
+                                 order_by=ProductORM.name)
+    last = ProductStorage.page(after=ProductStorage.key(second[-1], ProductORM.name), limit=10,
+                               order_by=ProductORM.name)
+
+    assert [p.name for p in first + second + last] == [f'product {i:02}' for i in range(25)]
+    assert len(last) == 5
+
+    page = ProductStorage.page(after=ProductStorage.key(first[4]), limit=3)
+    assert [p.id for p in page] == [first[4].id + 1, first[4].id + 2, first[4].id + 3]
+
+
+def test_list_columns(products):
+    food, other = products
+
+    rows = ProductStorage.list(filter_by={'category_id': food.id}, columns=[ProductORM.name])
+    assert sorted(rows) == [(f'product {i:02}',) for i in range(1, 25, 2)]
+    assert rows[0].name.startswith('product')
+
+    rows = ProductStorage.list(filter_by={'name': 'product 00'}, map=True)
+    assert rows == [{'id': 25, 'name': 'product 00', 'category_id': other.id, 'provider_inn': None}]
+
+    rows = ProductStorage.list(filter_by={'name': 'product 00'}, columns=[ProductORM.id, ProductORM.name], map=True)
+    assert rows == [{'id': 25, 'name': 'product 00'}]
+
+
+def test_iter_columns(products):
+    rows = list(ProductStorage.iter(batch_size=10, columns=[ProductORM.name], order_by=ProductORM.name))
+    assert [row.name for row in rows] == [f'product {i:02}' for i in range(25)]
+    assert rows[0]._fields == ('name', 'id')
+
+    rows = list(ProductStorage.iter(batch_size=10, columns=[ProductORM.name], map=True))
+    assert [row['name'] for row in rows] == [f'product {i:02}' for i in reversed(range(25))]
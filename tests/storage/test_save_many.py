@@ -0,0 +1,84 @@
+import json
+
+from sqlalchemy import text
+
+from src.receipts.fast_parse import parse_ticket_fast
+from src.receipts.json_parse import TicketParser
+from src.storage.models import (CategoryORM, ProductORM, PurchaseORM, QRCodeORM,
+                                StorageORM, TicketORM)
+from src.storage.cache import product_cache
+from src.storage.repository import CategoryStorage, ProductStorage, QRCodeStorage, TicketStorage
+
+
+def make_ticket(ticket_json: str, i: int) -> TicketParser:
+    ticket = json.loads(ticket_json)
+    ticket['id'] = f"{i:024x}"
+    ticket['qr'] = f"qr_{i}"
+    return TicketParser.model_validate_json(json.dumps(ticket, ensure_ascii=False))
+
+
+def test_save_many(clean_db, session, ticket_json):
+    category_id = CategoryStorage.add({'name': 'Продукты'})[0].id
+    stored_product = ProductStorage.add({'name': 'Хлеб Бородинский на закваске 300гр',
+                                         'category_id': category_id})[0]
+    QRCodeStorage.add({'qr': 'qr_0', 'json_': None})
+    tickets = [make_ticket(ticket_json, i) for i in range(3)]
+
+    saved = TicketStorage.save_many(tickets + tickets[:1], category_id)
+
+    assert saved == {ticket.id for ticket in tickets}
+    assert session.query(TicketORM).count() == 3
+    assert session.query(StorageORM).count() == 1
+    assert session.query(QRCodeORM).count() == 3
+    assert session.get(QRCodeORM, 'qr_0').json_ == tickets[0].qr_code.json_
+    assert session.query(ProductORM).count() == 3
+    assert session.query(PurchaseORM).count() == 9
+    assert session.query(PurchaseORM).filter_by(product_id=stored_product.id).count() == 3
+
+    ticket = session.get(TicketORM, tickets[1].id)
+    assert (ticket.qr, ticket.storage_inn, ticket.date_time, ticket.total_sum) == (
+        'qr_1', 268040102, 1707649200, 41170)
+    assert [(p.product.name, p.price, p.quantity, p.sum) for p in ticket.purchases] == [
+        (p.product.name, p.price, p.quantity, p.sum) for p in tickets[1].purchases]
+
+
+def test_save_many_skip_stored(clean_db, session, ticket_json):
+    category_id = CategoryStorage.add({'name': 'Продукты'})[0].id
+    tickets = [make_ticket(ticket_json, i) for i in range(2)]
+    TicketStorage.save_many(tickets[:1], category_id)
+
+    saved = TicketStorage.save_many([parse_ticket_fast(ticket.qr_code.json_) for ticket in tickets], category_id)
+
+    assert saved == {tickets[1].id}
+    assert TicketStorage.save_many(tickets, category_id) == set()
+    assert TicketStorage.save_many([], category_id) == set()
+    assert session.query(TicketORM).count() == 2
+    assert session.query(ProductORM).count() == 3
+
+
+def test_save_many_stale_product_cache(clean_db, session, ticket_json):
+    category_id = CategoryStorage.add({'name': 'Продукты'})[0].id
+    ticket = make_ticket(ticket_json, 0)
+    names = [purchase.product.name for purchase in ticket.purchases]
+    assert product_cache.ids(names) == {}
+    # another process inserts the product, the cache still has the name as absent
+    session.execute(text("INSERT INTO products (name, category_id) VALUES (:name, :category_id)"),
+                    {'name': names[0], 'category_id': category_id})
+    session.commit()
+    product_cache._rows[names[0]] = None
+
+    assert TicketStorage.save_many([ticket], category_id) == {ticket.id}
+    assert session.query(ProductORM).count() == 3
+    assert session.query(PurchaseORM).count() == 3
+
+
+def test_save_many_scanned_qr_code(clean_db, session, ticket_json):
+    category_id = CategoryStorage.add({'name': 'Продукты'})[0].id
+    ticket = make_ticket(ticket_json, 0)
+    # the qr code of the ticket is added by a scan of images, without json
+    assert QRCodeStorage.add_new([ticket.qr_code.qr]) == {ticket.qr_code.qr}
+
+    assert TicketStorage.save_many([ticket], category_id) == {ticket.id}
+    assert session.query(QRCodeORM).count() == 1
+    assert session.get(QRCodeORM, ticket.qr_code.qr).json_ == ticket.qr_code.json_
+    assert session.get(TicketORM, ticket.id).qr == ticket.qr_code.qr
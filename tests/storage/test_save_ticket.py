@@ -1,6 +1,7 @@
 import json
 
-from src.receipts.json_parse import TicketParser
+from src.receipts.json_parse import TicketParser, PurchaseParser
+from src.storage.base import conversion_plan
 from src.storage.models import (TicketORM, CategoryORM, StorageORM,
                                 PurchaseORM, ProductORM, QRCodeORM)
 
@@ -36,3 +37,16 @@ def test_save_ticket(ticket_json, session):
 
     assert session.query(PurchaseORM).count() == 3
     assert session.query(ProductORM).count() == 3
+
+
+def test_conversion_plan(ticket_json):
+    ticket_parser = TicketParser.model_validate_json(ticket_json)
+    TicketORM.from_pydantic(ticket_parser)
+
+    plan = conversion_plan(TicketORM, TicketParser)
+
+    assert plan is conversion_plan(TicketORM, TicketParser)
+    assert plan.columns == ('id', 'date_time', 'total_sum')
+    assert plan.scalars == (('qr_code', QRCodeORM), ('storage', StorageORM))
+    assert plan.lists == (('purchases', PurchaseORM),)
+    assert conversion_plan(PurchaseORM, PurchaseParser).scalars == (('product', ProductORM),)